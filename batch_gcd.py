@@ -0,0 +1,145 @@
+"""
+batch_gcd.py - Búsqueda de factores compartidos entre muchos módulos RSA
+---
+Autor: Erik Alberto Ríos Mena
+
+Implementa el mcd por lotes de Bernstein: un árbol de productos y un árbol
+de residuos encuentran, en tiempo casi lineal, cada módulo que comparte un
+factor primo con otro módulo del corpus. Cada nivel de los árboles se
+guarda en disco, de modo que en memoria sólo hay un bloque de un nivel a la vez.
+
+Uso: python batch_gcd.py moduli.txt [-w procesos] [-d directorio]
+"""
+
+import os
+import sys
+import math
+import argparse
+import tempfile
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+
+def read_moduli(source):
+    """
+    read_moduli(source): Lee módulos de un archivo de texto
+    ---
+    Entrada: source es una ruta o un archivo abierto, con un módulo por línea en
+             decimal o en hexadecimal con prefijo 0x; se ignoran líneas vacías y
+             comentarios con #
+
+    Salida:  un generador con los módulos como enteros
+    """
+    archivo=open(source) if isinstance(source,(str,os.PathLike)) else source
+    try:
+        for linea in archivo:
+            linea=linea.split("#",1)[0].strip()
+            if linea:
+                yield int(linea,0)
+    finally:
+        if archivo is not source:
+            archivo.close()
+
+def _write_level(path,values):
+    # Escribe enteros con un prefijo de 8 bytes para su longitud; regresa cuántos escribió
+    count=0
+    with open(path,"wb") as archivo:
+        for v in values:
+            datos=v.to_bytes((v.bit_length()+7)//8,'big')
+            archivo.write(len(datos).to_bytes(8,'big'))
+            archivo.write(datos)
+            count+=1
+    return count
+
+def _read_level(path):
+    # Lee de vuelta los enteros de _write_level sin cargar todo el nivel
+    with open(path,"rb") as archivo:
+        while(True):
+            size=archivo.read(8)
+            if not size:
+                return
+            yield int.from_bytes(archivo.read(int.from_bytes(size,'big')),'big')
+
+def _batches(values,size):
+    # Agrupa un iterable en listas de a lo más size elementos
+    values=iter(values)
+    while(True):
+        batch=list(islice(values,size))
+        if not batch:
+            return
+        yield batch
+
+def _products(values):
+    # Productos de pares consecutivos; un elemento sin pareja sube tal cual
+    return [values[i]*values[i+1] if i+1<len(values) else values[i] for i in range(0,len(values),2)]
+
+def _remainders(parents,children):
+    # Residuo de cada padre módulo el cuadrado de cada uno de sus hijos
+    return [parents[i//2]%(c*c) for i,c in enumerate(children)]
+
+def _map(pool,workers,func,*batches):
+    # Aplica func a cada bloque, en serie o en el pool, conservando el orden; al pool
+    # sólo se envían 2*workers bloques a la vez para no leer todo el nivel
+    if pool is None:
+        yield from map(func,*batches)
+        return
+    groups=zip(*batches)
+    while(True):
+        window=list(islice(groups,2*workers))
+        if not window:
+            return
+        yield from pool.map(func,*zip(*window))
+
+def batch_gcd(moduli,workers=None,directory=None,batch=1024):
+    """
+    batch_gcd(moduli,workers=None,directory=None,batch=1024): Mcd por lotes de Bernstein
+    ---
+    Entrada: moduli es un iterable de módulos RSA (se lee una sola vez)
+             workers es la cantidad de procesos por nivel (default: None, i.e. en serie)
+             directory es donde guardar los niveles de los árboles (default: temporal)
+             batch es la cantidad de nodos procesados a la vez en cada nivel
+
+    Salida:  un generador de tuplas (i, n_i, g) para cada módulo n_i que comparte
+             un factor g>1 con algún otro módulo (g==n_i si comparte todos sus factores)
+    """
+
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        pool=ProcessPoolExecutor(max_workers=workers) if workers is not None and workers>1 else None
+        try:
+            # Árbol de productos: cada nivel es el producto de pares del anterior
+            sizes=[_write_level(os.path.join(tmp,"p0"),moduli)]
+            if sizes[0]<2:
+                return
+            while(sizes[-1]>1):
+                k=len(sizes)
+                batches=_batches(_read_level(os.path.join(tmp,f"p{k-1}")),2*batch)
+                products=(x for chunk in _map(pool,workers,_products,batches) for x in chunk)
+                sizes.append(_write_level(os.path.join(tmp,f"p{k}"),products))
+            # Árbol de residuos: R_hijo=R_padre mod hijo^2, desde la raíz hasta las hojas
+            os.replace(os.path.join(tmp,f"p{len(sizes)-1}"),os.path.join(tmp,f"r{len(sizes)-1}"))
+            for k in range(len(sizes)-2,-1,-1):
+                parents=_batches(_read_level(os.path.join(tmp,f"r{k+1}")),batch)
+                children=_batches(_read_level(os.path.join(tmp,f"p{k}")),2*batch)
+                remainders=(x for chunk in _map(pool,workers,_remainders,parents,children) for x in chunk)
+                _write_level(os.path.join(tmp,f"r{k}"),remainders)
+                os.remove(os.path.join(tmp,f"r{k+1}"))
+                if k>0:
+                    os.remove(os.path.join(tmp,f"p{k}"))
+            # En las hojas, gcd(R_i/n_i, n_i) es el factor compartido
+            leaves=zip(_read_level(os.path.join(tmp,"p0")),_read_level(os.path.join(tmp,"r0")))
+            for i,(n,r) in enumerate(leaves):
+                g=math.gcd(r//n,n)
+                if g!=1:
+                    yield i,n,g
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+if __name__ == '__main__':
+    parser=argparse.ArgumentParser(description="Reporta los módulos RSA que comparten factores primos.")
+    parser.add_argument("moduli",help="archivo con un módulo por línea ('-' para la entrada estándar)")
+    parser.add_argument("-w","--workers",type=int,default=None,help="procesos por nivel del árbol")
+    parser.add_argument("-d","--directory",default=None,help="directorio para los niveles del árbol")
+    args=parser.parse_args()
+    source=sys.stdin if args.moduli=="-" else args.moduli
+    for i,n,g in batch_gcd(read_moduli(source),workers=args.workers,directory=args.directory):
+        print(f"{i} {n:x} {g:x}")
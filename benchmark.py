@@ -0,0 +1,366 @@
+"""
+benchmark.py - Mediciones de tiempo de las rutinas de rsa.py y factoring.py
+---
+Autor: Erik Alberto Ríos Mena
+
+Suite de mediciones reproducibles: cada caso prepara sus entradas con una
+semilla fija y se mide con timeit varias veces. Los resultados se guardan
+en JSON y sirven como línea base para detectar regresiones. Antes de medir
+se verifica que importar rsa y factoring no cargue numpy, sympy ni matplotlib.
+
+Uso:
+    python benchmark.py run [-k filtro] [-r repeticiones] [-o resultados.json]
+                            [--baseline base.json] [--umbral 0.1]
+    python benchmark.py compare resultados.json base.json [--umbral 0.1]
+    python benchmark.py plot resultados.json [--baseline base.json] [-o figura.png]
+"""
+
+import os
+import sys
+import json
+import math
+import random
+import timeit
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+import rsa
+import cache
+import factoring
+import keystore
+from instrumentation import format_time
+
+# Casos registrados: nombre -> (preparar, number); preparar(semilla) regresa la
+# función sin argumentos a medir, y number es cuántas veces llamarla por repetición
+CASOS={}
+
+def caso(nombre,number=1):
+    """
+    caso(nombre,number=1): Decorador que registra un caso de la suite
+    Entrada: nombre es el identificador del caso
+             number es la cantidad de llamadas por repetición
+    Salida:  el decorador
+    """
+    def registrar(preparar):
+        CASOS[nombre]=(preparar,number)
+        return preparar
+    return registrar
+
+def _clave(bits,semilla):
+    # Clave con e=65537 y primos generados desde la semilla
+    random.seed(semilla)
+    while(True):
+        p,q=rsa.generate_prime(bits,n=2,base=2)
+        try:
+            return rsa.PrivateKey(p,q,65537,rsa.modular_inverse(65537,(p-1)*(q-1)))
+        except ValueError:
+            continue
+
+def _semiprimo(bits,semilla):
+    # Producto de dos primos de bits/2 bits cada uno
+    random.seed(semilla)
+    p,q=rsa.generate_prime(bits//2,n=2,base=2)
+    return p*q
+
+#===================
+# Casos de la suite
+#===================
+
+for _bits in (256,512,1024):
+    @caso(f"prime/{_bits}",number=5)
+    def _(semilla,bits=_bits):
+        random.seed(semilla)
+        return lambda: rsa.generate_prime(bits,base=2)
+
+for _bits in (256,512):
+    # generate_keys reinicia la semilla, así que aquí sólo cuentan las estadísticas
+    @caso(f"keys/{_bits}",number=3)
+    def _(semilla,bits=_bits):
+        return lambda: rsa.generate_private_key(bits=bits)
+
+def _clave_multiprimo(modulo,primos,semilla):
+    # Clave de un módulo de modulo bits repartidos en primos factores
+    random.seed(semilla)
+    while(True):
+        p=rsa.generate_prime(modulo//primos,n=primos,base=2)
+        if len(set(p))<primos:
+            continue
+        try:
+            return rsa.PrivateKey(p[0],p[1],65537,rsa.modular_inverse(65537,math.prod(x-1 for x in p)),p[2:])
+        except ValueError:
+            continue
+
+for _modulo in (2048,3072,4096):
+    for _primos in (2,3,4):
+        @caso(f"decrypt_multiprime/{_modulo}/{_primos}",number=10)
+        def _(semilla,modulo=_modulo,primos=_primos):
+            key=_clave_multiprimo(modulo,primos,semilla)
+            cypher=rsa.raw_encrypt("Hola tú.",key.e,key.n)
+            return lambda: rsa.crt_decrypt(cypher,key)
+
+for _primos in (2,3,4):
+    @caso(f"keys_multiprime/3072/{_primos}")
+    def _(semilla,primos=_primos):
+        return lambda: rsa.generate_private_key(p=[None]*primos,bits=3072//primos)
+
+for _bits in (512,1024):
+    @caso(f"decrypt_raw/{_bits}",number=20)
+    def _(semilla,bits=_bits):
+        key=_clave(bits,semilla)
+        cypher=rsa.raw_encrypt("Hola tú.",key.e,key.n)
+        return lambda: rsa.raw_decrypt(cypher,key.d,key.n)
+
+    @caso(f"decrypt_crt/{_bits}",number=20)
+    def _(semilla,bits=_bits):
+        key=_clave(bits,semilla)
+        cypher=rsa.raw_encrypt("Hola tú.",key.e,key.n)
+        return lambda: rsa.crt_decrypt(cypher,key)
+
+    @caso(f"encrypt_many/{_bits}")
+    def _(semilla,bits=_bits):
+        key=_clave(bits,semilla)
+        messages=[f"mensaje {i}" for i in range(1000)]
+        return lambda: rsa.encrypt_many(messages,key.e,key.n)
+
+    @caso(f"decrypt_many/{_bits}")
+    def _(semilla,bits=_bits):
+        key=_clave(bits,semilla)
+        cyphers=rsa.encrypt_many([f"mensaje {i}" for i in range(100)],key.e,key.n)
+        return lambda: rsa.decrypt_many(cyphers,key)
+
+    @caso(f"stream/{_bits}")
+    def _(semilla,bits=_bits):
+        key=_clave(bits,semilla)
+        data=random.Random(semilla).randbytes(1<<14)
+        return lambda: b"".join(rsa.decrypt_stream(rsa.encrypt_stream(data,key.e,key.n),key))
+
+@caso("keystore/dump/1000",number=5)
+def _(semilla):
+    key=_clave(512,semilla)
+    return lambda: [keystore.dump_key(key) for _ in range(1000)]
+
+@caso("keystore/open_load/1000",number=5)
+def _(semilla):
+    # Abre un almacén de 1000 claves y las lee todas desde el mapeo
+    key=_clave(512,semilla)
+    path=os.path.join(tempfile.mkdtemp(),"claves.store")
+    keystore.write_keystore(path,{i:key for i in range(1000)})
+    def cargar():
+        with keystore.Keystore(path) as almacen:
+            return [almacen[i] for i in range(1000)]
+    return cargar
+
+for _bits in (64,512,2048):
+    for _method in ("euclid","lehmer","pow"):
+        @caso(f"inverse/{_method}/{_bits}",number=10)
+        def _(semilla,bits=_bits,method=_method):
+            random.seed(semilla)
+            m=rsa.generate_prime(bits,base=2)
+            values=[random.randrange(2,m) for _ in range(100)]
+            return lambda: [rsa.modular_inverse(a,m,method) for a in values]
+
+    @caso(f"inverse/batch/{_bits}",number=10)
+    def _(semilla,bits=_bits):
+        random.seed(semilla)
+        m=rsa.generate_prime(bits,base=2)
+        values=[random.randrange(2,m) for _ in range(100)]
+        return lambda: rsa.batch_inverse(values,m)
+
+for _bits in (512,1024,2048):
+    # Cuadrados de la prueba de Miller-Rabin: pow(x,2,n) contra x*x%n
+    for _metodo in ("pow","mul"):
+        @caso(f"modexp/square_{_metodo}/{_bits}",number=5)
+        def _(semilla,bits=_bits,metodo=_metodo):
+            random.seed(semilla)
+            n=random.getrandbits(bits)|1<<(bits-1)|1
+            x=random.randrange(n)
+            if metodo=="pow":
+                return lambda: [pow(x,2,n) for _ in range(1000)]
+            return lambda: [x*x%n for _ in range(1000)]
+
+for _nombre,_bits in (("division_tentativa",32),("division_tentativa2",40),("division_tentativa3",40),
+                      ("division_tentativa_criba",40),("division_tentativa_sp",40),("pollard_rho",64),
+                      ("pollard_p_menos_1",64),("factorizar",96)):
+    @caso(f"factor/{_nombre}/{_bits}")
+    def _(semilla,nombre=_nombre,bits=_bits):
+        n=_semiprimo(bits,semilla)
+        algoritmo=getattr(factoring,nombre)
+        return lambda: algoritmo(n)
+
+@caso("factor/ecm/15x40")
+def _(semilla):
+    # Factor de 15 dígitos en un compuesto de 55: ECM no depende del tamaño de n
+    random.seed(semilla)
+    n=rsa.generate_prime(15)*rsa.generate_prime(40)
+    return lambda: factoring.ecm(n,semilla=semilla)
+
+for _estado in ("fria","caliente"):
+    @caso(f"cache/{_estado}/100x64")
+    def _(semilla,estado=_estado):
+        # Auditoría de 100 módulos de 64 bits: sin caché previa, o repetida sobre una caché llena
+        moduli=[_semiprimo(64,semilla+i) for i in range(100)]
+        llena=cache.ResultCache()
+        if estado=="caliente":
+            for n in moduli:
+                llena.factor(n)
+        return lambda: [(llena if estado=="caliente" else cache.ResultCache()).factor(n) for n in moduli]
+
+@caso("factor/criba_cuadratica/100")
+def _(semilla):
+    import numpy
+    n=_semiprimo(100,semilla)
+    return lambda: factoring.criba_cuadratica(n)
+
+@caso("primality/es_primo/1024",number=20)
+def _(semilla):
+    random.seed(semilla)
+    valores=[random.getrandbits(1024)|1 for _ in range(10)]
+    return lambda: [factoring.es_primo(v) for v in valores]
+
+@caso("primality/clasificar_primos/1e5")
+def _(semilla):
+    import numpy
+    return lambda: factoring.clasificar_primos(range(10**6,10**6+10**5))
+
+# Módulos opcionales que no deben cargarse al importar rsa y factoring
+PESADOS=("numpy","sympy","matplotlib")
+
+def _python(codigo):
+    # Corre código en un intérprete nuevo desde este directorio y regresa su salida
+    return subprocess.run([sys.executable,"-c",codigo],capture_output=True,text=True,check=True,
+                          cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+
+for _modulos in ("rsa","factoring","rsa,factoring"):
+    @caso(f"import/{_modulos}")
+    def _(semilla,modulos=_modulos):
+        return lambda: _python(f"import {modulos}")
+
+def importaciones_pesadas(modulos="rsa,factoring"):
+    """
+    importaciones_pesadas(modulos="rsa,factoring"): Revisa qué dependencias pesadas carga una importación
+    Entrada: modulos es la lista de módulos a importar, separados por comas
+    Salida:  una lista con los módulos de PESADOS que quedaron en sys.modules
+    """
+    salida=_python(f"import sys,{modulos}\n"
+                   f"print(*(m for m in {PESADOS!r} if m in sys.modules))")
+    return salida.split()
+
+#======================
+# Ejecución y reportes
+#======================
+
+def ejecutar(filtro=None,repeticiones=5,semilla=0):
+    """
+    ejecutar(filtro=None,repeticiones=5,semilla=0): Corre los casos de la suite
+    Entrada: filtro es una subcadena para elegir casos (default: None, i.e. todos)
+             repeticiones es la cantidad de mediciones de cada caso
+             semilla fija las entradas de cada caso
+    Salida:  un diccionario con el entorno y las estadísticas (en segundos por
+             llamada) de cada caso; los casos sin sus dependencias se omiten
+    """
+    resultados={"python":platform.python_version(),"plataforma":platform.platform(),
+                "semilla":semilla,"casos":{}}
+    for nombre,(preparar,number) in CASOS.items():
+        if filtro is not None and filtro not in nombre:
+            continue
+        try:
+            stmt=preparar(semilla)
+        except ImportError as error:
+            print(f"{nombre:36} omitido ({error.name} no está instalado)")
+            continue
+        tiempos=[t/number for t in timeit.Timer(stmt).repeat(repeticiones,number)]
+        resultados["casos"][nombre]={"min":min(tiempos),
+                                     "mediana":statistics.median(tiempos),
+                                     "media":statistics.mean(tiempos),
+                                     "desviacion":statistics.stdev(tiempos) if len(tiempos)>1 else 0.0,
+                                     "repeticiones":repeticiones}
+        print(f"{nombre:36} mediana {format_time(statistics.median(tiempos)):>22}"
+              f"   mín {format_time(min(tiempos)):>22}")
+    return resultados
+
+def comparar(resultados,base,umbral=0.1):
+    """
+    comparar(resultados,base,umbral=0.1): Compara resultados contra una línea base
+    Entrada: resultados y base son salidas de ejecutar
+             umbral es el aumento relativo de la mediana que cuenta como regresión
+    Salida:  una lista con los nombres de los casos que empeoraron
+    """
+    regresiones=[]
+    for nombre,actual in resultados["casos"].items():
+        if nombre not in base["casos"]:
+            continue
+        anterior=base["casos"][nombre]["mediana"]
+        cambio=actual["mediana"]/anterior-1
+        print(f"{nombre:36} {format_time(anterior):>22} -> {format_time(actual['mediana']):>22}"
+              f" {cambio:+8.1%}{'  REGRESIÓN' if cambio>umbral else ''}")
+        if cambio>umbral:
+            regresiones.append(nombre)
+    return regresiones
+
+def graficar(resultados,ruta,base=None):
+    """
+    graficar(resultados,ruta,base=None): Gráfica de barras de las medianas
+    Entrada: resultados es una salida de ejecutar
+             ruta es el archivo de imagen a escribir
+             base es una línea base opcional para graficar a un lado
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    nombres=list(resultados["casos"])
+    y=range(len(nombres))
+    fig=plt.figure(figsize=(8,0.25*len(nombres)+1))
+    plt.barh([i+0.2 for i in y],[resultados["casos"][c]["mediana"] for c in nombres],height=0.4,label="actual")
+    if base is not None:
+        plt.barh([i-0.2 for i in y],[base["casos"].get(c,{}).get("mediana",0) for c in nombres],height=0.4,label="base")
+    plt.yticks(list(y),nombres)
+    plt.xscale("log")
+    plt.xlabel("Segundos por llamada (mediana)")
+    plt.legend()
+    plt.tight_layout()
+    fig.savefig(ruta)
+    plt.close(fig)
+
+def _cargar(ruta):
+    with open(ruta) as archivo:
+        return json.load(archivo)
+
+if __name__ == '__main__':
+    parser=argparse.ArgumentParser(description="Suite de mediciones de rsa.py y factoring.py.")
+    sub=parser.add_subparsers(dest="orden",required=True)
+    run=sub.add_parser("run",help="corre la suite")
+    run.add_argument("-k","--filtro",default=None,help="sólo los casos que contengan esta subcadena")
+    run.add_argument("-r","--repeticiones",type=int,default=5)
+    run.add_argument("-s","--semilla",type=int,default=0)
+    run.add_argument("-o","--salida",default=None,help="archivo JSON para los resultados")
+    run.add_argument("--baseline",default=None,help="línea base contra la que comparar")
+    run.add_argument("--umbral",type=float,default=0.1)
+    compare=sub.add_parser("compare",help="compara dos archivos de resultados")
+    compare.add_argument("resultados")
+    compare.add_argument("baseline")
+    compare.add_argument("--umbral",type=float,default=0.1)
+    plot=sub.add_parser("plot",help="grafica un archivo de resultados (requiere matplotlib)")
+    plot.add_argument("resultados")
+    plot.add_argument("--baseline",default=None)
+    plot.add_argument("-o","--salida",default="benchmark.png")
+    args=parser.parse_args()
+
+    if args.orden=="run":
+        pesados=importaciones_pesadas()
+        if pesados:
+            print(f"import rsa, factoring carga {', '.join(pesados)}")
+            sys.exit(1)
+        resultados=ejecutar(args.filtro,args.repeticiones,args.semilla)
+        if args.salida is not None:
+            with open(args.salida,"w") as archivo:
+                json.dump(resultados,archivo,indent=1)
+        if args.baseline is not None and comparar(resultados,_cargar(args.baseline),args.umbral):
+            sys.exit(1)
+    elif args.orden=="compare":
+        if comparar(_cargar(args.resultados),_cargar(args.baseline),args.umbral):
+            sys.exit(1)
+    else:
+        graficar(_cargar(args.resultados),args.salida,_cargar(args.baseline) if args.baseline else None)
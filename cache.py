@@ -0,0 +1,219 @@
+"""
+cache.py - Memoización persistente de pruebas de primalidad y factorizaciones
+---
+Autor: Erik Alberto Ríos Mena
+
+Guarda el resultado de cada llamada según el algoritmo y sus argumentos, en
+una capa LRU en memoria y, opcionalmente, en una base sqlite que comparten
+varios procesos. Las factorizaciones se guardan además como parciales
+(primos ya separados y cofactores compuestos pendientes), de modo que una
+llamada posterior, quizá con un algoritmo más fuerte, reanuda desde los
+cofactores en lugar de empezar desde n.
+
+Uso:
+    cache=ResultCache("auditoria.db")
+    miller_rabin=cache.memoize(factoring.miller_rabin)
+    try_decrypt=cache.memoize(rsa.try_decrypt)
+    factores=cache.factor(n)
+"""
+
+import pickle
+import sqlite3
+import functools
+from collections import OrderedDict
+import factoring
+
+class ResultCache:
+    """
+    ResultCache(path=None,maxsize=4096): Caché de resultados con capa LRU y almacén en disco
+    ---
+    Entrada: path es el archivo sqlite compartido (default: None, i.e. sólo en memoria)
+             maxsize es la cantidad de resultados que guarda la capa LRU
+
+    Contadores: hits (en memoria), disk_hits (en sqlite), misses y stores.
+    """
+
+    def __init__(self,path=None,maxsize=4096):
+        self.maxsize=maxsize
+        self.hits=0
+        self.disk_hits=0
+        self.misses=0
+        self.stores=0
+        self._lru=OrderedDict()
+        self._db=None
+        if path is not None:
+            # timeout espera a que otros procesos suelten el candado de escritura
+            self._db=sqlite3.connect(path,timeout=30.0)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS resultados (clave TEXT PRIMARY KEY, valor BLOB)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS parciales (n TEXT PRIMARY KEY, primos TEXT, compuestos TEXT)")
+            self._db.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc):
+        self.close()
+
+    def _remember(self,clave,valor):
+        # Agrega a la capa LRU, desalojando el menos reciente si está llena
+        self._lru[clave]=valor
+        self._lru.move_to_end(clave)
+        if len(self._lru)>self.maxsize:
+            self._lru.popitem(last=False)
+
+    def get(self,clave):
+        """
+        get(clave): Busca un resultado
+        ---
+        Entrada: clave es una cadena que identifica al algoritmo y sus argumentos
+        Salida:  una tupla (encontrado, valor)
+        """
+        if clave in self._lru:
+            self._lru.move_to_end(clave)
+            self.hits+=1
+            return True,self._lru[clave]
+        if self._db is not None:
+            fila=self._db.execute("SELECT valor FROM resultados WHERE clave=?",(clave,)).fetchone()
+            if fila is not None:
+                valor=pickle.loads(fila[0])
+                self._remember(clave,valor)
+                self.disk_hits+=1
+                return True,valor
+        self.misses+=1
+        return False,None
+
+    def put(self,clave,valor):
+        """
+        put(clave,valor): Guarda un resultado
+        ---
+        Entrada: clave es una cadena que identifica al algoritmo y sus argumentos
+                 valor es el resultado (cualquier objeto que se pueda serializar con pickle)
+        """
+        self._remember(clave,valor)
+        self.stores+=1
+        if self._db is not None:
+            with self._db:
+                self._db.execute("INSERT OR REPLACE INTO resultados VALUES (?,?)",(clave,pickle.dumps(valor)))
+
+    def memoize(self,func):
+        """
+        memoize(func): Versión de un algoritmo que consulta la caché antes de calcular
+        ---
+        Entrada: func es una función determinista de enteros (e.g. factoring.miller_rabin
+                 con un número de pruebas fijo, factoring.division_tentativa_criba o
+                 rsa.try_decrypt)
+        Salida:  la función envuelta; la clave es el nombre de func y sus argumentos
+        """
+        nombre=f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def envoltura(*args,**kwargs):
+            clave=f"{nombre}{args!r}{sorted(kwargs.items())!r}"
+            encontrado,valor=self.get(clave)
+            if not encontrado:
+                valor=func(*args,**kwargs)
+                self.put(clave,valor)
+            return valor
+        return envoltura
+
+    def known_factors(self,n):
+        """
+        known_factors(n): Factorización parcial guardada de n
+        ---
+        Entrada: un entero n
+        Salida:  una tupla (primos, compuestos) con los factores ya separados de n
+                 y los cofactores que faltan, o None si no hay registro
+        """
+        clave=f"parcial:{n}"
+        if clave in self._lru:
+            self._lru.move_to_end(clave)
+            self.hits+=1
+            return self._lru[clave]
+        if self._db is not None:
+            fila=self._db.execute("SELECT primos,compuestos FROM parciales WHERE n=?",(str(n),)).fetchone()
+            if fila is not None:
+                valor=tuple([int(x) for x in columna.split()] for columna in fila)
+                self._remember(clave,valor)
+                self.disk_hits+=1
+                return valor
+        self.misses+=1
+        return None
+
+    def record_factors(self,n,factores):
+        """
+        record_factors(n,factores): Guarda una factorización, posiblemente parcial
+        ---
+        Entrada: n es el entero factorizado
+                 factores es una lista de factores cuyo producto es n; los compuestos
+                 quedan como cofactores pendientes
+        Salida:  la tupla (primos, compuestos) guardada
+        """
+        primos,compuestos=[],[]
+        for f in factores:
+            (primos if f==1 or factoring.es_primo(f) else compuestos).append(f)
+        primos=sorted(f for f in primos if f!=1)
+        compuestos.sort()
+        valor=(primos,compuestos)
+        self._remember(f"parcial:{n}",valor)
+        self.stores+=1
+        if self._db is not None:
+            with self._db:
+                self._db.execute("INSERT OR REPLACE INTO parciales VALUES (?,?,?)",
+                                 (str(n)," ".join(map(str,primos))," ".join(map(str,compuestos))))
+        return valor
+
+    def factor(self,n,algorithm=None):
+        """
+        factor(n,algorithm=None): Factorización que reanuda desde los cofactores conocidos
+        ---
+        Entrada: n es un entero positivo
+                 algorithm es una función que recibe un entero y regresa una lista de
+                 factores, quizá con compuestos (default: None, i.e. factoring.factorizar)
+        Salida:  un array con los factores de n; los cofactores que algorithm no
+                 logró separar se dejan compuestos
+        """
+        if algorithm is None:
+            algorithm=lambda m: factoring.factorizar(m)[0]
+        primos,compuestos=[],[]
+        pendientes=[n] if n>1 else []
+        nuevos=False
+        while(pendientes):
+            m=pendientes.pop()
+            conocido=self.known_factors(m)
+            if conocido is None or conocido[1]==[m]:
+                # Sin registro, o el registro no avanzó: correr el algoritmo sobre m
+                conocido=self.record_factors(m,algorithm(m))
+                nuevos=True
+                if conocido[1]==[m]:
+                    compuestos.append(m)
+                    continue
+            primos+=conocido[0]
+            pendientes+=conocido[1]
+        # Con puros aciertos, o si el registro de n ya está completo, no hay nada que escribir
+        if nuevos and self._lru.get(f"parcial:{n}")!=(sorted(primos),sorted(compuestos)):
+            self.record_factors(n,primos+compuestos)
+        return sorted(primos+compuestos)
+
+    def stats(self):
+        """
+        stats(): Contadores de la caché
+        ---
+        Salida:  un diccionario con aciertos en memoria y en disco, fallos,
+                 resultados guardados, tamaño de la capa LRU y tasa de aciertos
+        """
+        consultas=self.hits+self.disk_hits+self.misses
+        return {"hits":self.hits,
+                "disk_hits":self.disk_hits,
+                "misses":self.misses,
+                "stores":self.stores,
+                "size":len(self._lru),
+                "hit_rate":(self.hits+self.disk_hits)/consultas if consultas else None}
+
+    def close(self):
+        """
+        close(): Cierra el almacén en disco
+        """
+        if self._db is not None:
+            self._db.close()
+            self._db=None
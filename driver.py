@@ -10,15 +10,16 @@
 import rsa
 import factoring
 import datetime
-import timeit
 import math
-import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.backends.backend_pgf as pgf
-from matplotlib import cycler
-from sympy import sieve, ntheory, li
 
 if __name__ == '__main__':
+    # Las dependencias de las gráficas sólo se cargan al correr el script
+    import numpy as np
+    import matplotlib.pyplot as plt
+    import matplotlib.backends.backend_pgf as pgf
+    from matplotlib import cycler
+    from sympy import sieve, ntheory, li
+
     # Código general de las gráficas.
     plt.close("all")
     colors = cycler("color",["#187f69","#8fe51f","#bf304f",
@@ -42,19 +43,8 @@ if __name__ == '__main__':
                 \setmainfont{Segoe UI}
                 \setmonofont{Consolas}""")
 
-    # t_1=[]
-    # exp=330
-    # n=2**2
-    # while n<2**(exp+1):
-    #     timer=timeit.Timer(f'rsa.generate_prime({int(math.log(n,2))},base=2)','import rsa')
-    #     t=timer.repeat(20,20)
-    #     t=[i/20 for i in t]
-    #     t_1.append(min(t))
-    #     n*=2
-    # fig = plt.figure(0,figsize=(8,4.5))
-    # plt.plot([i for i in range(2,exp+1)],t_1,'o-')
-    # plt.show()
-    # exit()
+    # Los tiempos de rsa.generate_prime por tamaño se miden con
+    # python benchmark.py run -k prime
 
     # Verificación de primalidad (división tentativa y prueba de Miller-Rabin)
     x=np.linspace(1,128,10000)
@@ -74,15 +64,10 @@ if __name__ == '__main__':
     pgf.FigureCanvasPgf(fig).print_pgf("o_pruebas_rand_aks.pgf")
     plt.close("all")
 
-    t_1=[]
-    t_2=[]
     exp=15
-    worst=[i for i in sieve.primerange(2**exp)]
-    for n in worst:
-        x,o=factoring.prueba_tentativa(n)
-        t_1.append(o)
-        x,o=factoring.prueba_tentativa2(n)
-        t_2.append(o)
+    worst=np.array(factoring.primos_hasta(2**exp))
+    x,t_1=factoring.clasificar_primos(worst,"tentativa")
+    x,t_2=factoring.clasificar_primos(worst,"tentativa2")
     x=np.linspace(2.,2**exp,10000)
     fig = plt.figure(0,figsize=(8,4.5))
     plt.plot(worst,t_1,label=r'Operaciones por número (división por tentativa desde $2$ hasta $n$)')
@@ -95,16 +80,10 @@ if __name__ == '__main__':
     pgf.FigureCanvasPgf(fig).print_pgf("o_prueba_tentativa.pgf")
     plt.close("all")
 
-    t_1=[]
-    t_2=[]
-    t_3=[]
     exp=4
-    worst=[i for i in sieve.primerange(2**exp)]
-    for n in worst:
-        x,o=factoring.prueba_tentativa(n)
-        t_1.append(o)
-        x,o=factoring.prueba_tentativa2(n)
-        t_2.append(o)
+    worst=np.array(factoring.primos_hasta(2**exp))
+    x,t_1=factoring.clasificar_primos(worst,"tentativa")
+    x,t_2=factoring.clasificar_primos(worst,"tentativa2")
     x=np.linspace(2.,2**exp,10000)
     fig = plt.figure(0,figsize=(8,4.5))
     plt.plot(worst,t_1,label=r'Operaciones por número (división por tentativa desde $2$ hasta $n$)')
@@ -139,27 +118,6 @@ if __name__ == '__main__':
     p=175
     print(f"es muy probable que {p} sea primo" if factoring.miller_rabin(p,10) else f"{p} no es primo")
     #print(rsa.generate_prime(10,3))
-    #n=int(input("Inserte el entero a factorizar: "))
-
-    # al chile esto me lo robé de timeit.py
-    units={"nanosegundos":1e-9,"microsegundos":1e-6,"milisegundos":1e-3,"segundos":1.0,"minutos":60.0}
-    precision=3
-    number=1
-    repeat=1
-    def format_time(dt):
-        scales = [(scale, unit) for unit, scale in units.items()]
-        scales.sort(reverse=True)
-        for scale, unit in scales:
-            if dt >= scale:
-                break
-        return "%.*g %s" % (precision, dt / scale, unit)
-    n=int(input("Inserte el entero a verificar: "))
-    print(f"{n} {'sí' if factoring.prueba_tentativa2(n) else 'no'} es primo")
-    timer=timeit.Timer(f'factoring.prueba_tentativa2({n})','import factoring')
-    raw_timings=timer.repeat(repeat, number)
-    timings = [dt / number for dt in raw_timings]
-    print("Tras %d %s, el mejor de %d fue: %s por bucle" % (number, 'bucles' if number != 1 else 'bucle', repeat, format_time(min(timings))))
-
     t_1=[]
     t_2=[]
     t_3=[]
@@ -172,14 +130,6 @@ if __name__ == '__main__':
         t_2.append(o)
         x,o=factoring.division_tentativa_criba(n)
         t_3.append(o)
-        #timer=timeit.Timer(f'factoring.division_tentativa2({n})','import factoring')
-        #raw_timings=timer.repeat(repeat, number)
-        #timings = [dt / number for dt in raw_timings]
-        #t_1.append(min(timings))
-        #timer=timeit.Timer(f'factoring.division_tentativa({n})','import factoring')
-        #raw_timings=timer.repeat(repeat, number)
-        #timings = [dt / number for dt in raw_timings]
-        #t_2.append(min(timings))
     #t_1.sort()
     #t_2.sort()
     #plt.plot(ran,t_1,'o',ran,t_2,'o')
@@ -203,7 +153,6 @@ if __name__ == '__main__':
 
 
 
-    #print("Tras %d %s, el mejor de %d fue: %s por bucle" % (number, 'bucles' if number != 1 else 'bucle', repeat, format_time(min(timings))))
     #ini=datetime.datetime.today()
     #print(f"Los factores de 13492928519 son: {factoring.division_tentativa(13492928519)}")
     #print(datetime.datetime.today()-ini)
\ No newline at end of file
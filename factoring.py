@@ -1,11 +1,117 @@
+import os
 import math
+import mmap
+import pickle
+import time
 import random
-from sympy import sieve
+import bisect
+import struct
+from array import array
+from itertools import compress
+import instrumentation
+
+#=================
+# Tablas de primos
+#=================
+
+def criba_eratostenes(n):
+    """
+    criba_eratostenes(n): Criba de Eratóstenes
+    Entrada: un entero n
+    Salida:  una lista con los primos menores que n
+    """
+    if n<3:
+        return []
+    # es_primo[i] indica si i sigue siendo candidato a primo
+    es_primo=bytearray([1])*n
+    es_primo[0]=es_primo[1]=0
+    for i in range(2,math.isqrt(n-1)+1):
+        if es_primo[i]:
+            es_primo[i*i::i]=bytes(len(range(i*i,n,i)))
+    return list(compress(range(n),es_primo))
+
+# Primos pequeños para descartar candidatos antes de pruebas más costosas
+PRIMOS_PEQUENOS=criba_eratostenes(2048)
+
+# Criba compartida: todos los primos menores que _limite_criba, como enteros de 32 bits.
+# Puede ser un array('I') o un memoryview sobre un archivo mapeado en memoria
+# Empieza con los primos pequeños para no cribar al importar; primos_hasta la crece al usarse
+_primos=array('I',PRIMOS_PEQUENOS)
+_limite_criba=2048
+# Cabecera de los archivos de criba: firma y límite
+_CABECERA_CRIBA=struct.Struct("<8sQ")
+_FIRMA_CRIBA=b"CRIBA\x00\x00\x01"
+
+def _extender_criba(limite,segmento=1<<18):
+    """
+    _extender_criba(limite,segmento=1<<18): Extiende la criba compartida por segmentos
+    Entrada: limite es la nueva cota de la criba
+             segmento es la cantidad de enteros cribados a la vez
+    """
+    global _primos,_limite_criba
+    if limite>1<<32:
+        raise ValueError("la criba compartida sólo guarda primos de 32 bits")
+    # Los primos base deben llegar a sqrt(limite)
+    if math.isqrt(limite)>=_limite_criba:
+        _extender_criba(math.isqrt(limite)+1,segmento)
+    if not isinstance(_primos,array):
+        # Copiar la criba mapeada de un archivo para poder crecerla
+        _primos=array('I',_primos)
+    for inf in range(_limite_criba,limite,segmento):
+        sup=min(inf+segmento,limite)
+        candidatos=bytearray([1])*(sup-inf)
+        for p in _primos:
+            if p*p>=sup:
+                break
+            ini=max(p*p,-(-inf//p)*p)
+            candidatos[ini-inf::p]=bytes(len(range(ini,sup,p)))
+        _primos.extend(compress(range(inf,sup),candidatos))
+    _limite_criba=max(_limite_criba,limite)
+
+def primos_hasta(n):
+    """
+    primos_hasta(n): Primos menores que n desde la criba compartida
+    Entrada: un entero n
+    Salida:  una secuencia de enteros con los primos menores que n; la criba
+             crece (al menos al doble) sólo cuando n excede lo ya cribado
+    """
+    if n>_limite_criba:
+        _extender_criba(max(n,min(2*_limite_criba,1<<32)))
+    return _primos[:bisect.bisect_left(_primos,n)]
+
+def guardar_criba(ruta):
+    """
+    guardar_criba(ruta): Guarda la criba compartida en un archivo binario
+    Entrada: ruta es el archivo a escribir
+    """
+    with open(ruta,"wb") as archivo:
+        archivo.write(_CABECERA_CRIBA.pack(_FIRMA_CRIBA,_limite_criba))
+        archivo.write(_primos)
+
+def cargar_criba(ruta):
+    """
+    cargar_criba(ruta): Carga una criba guardada con guardar_criba, mapeándola en memoria
+    Entrada: ruta es el archivo a leer
+    Salida:  el límite de la criba cargada; si es menor que el de la criba actual, no se reemplaza
+    """
+    global _primos,_limite_criba
+    with open(ruta,"rb") as archivo:
+        firma,limite=_CABECERA_CRIBA.unpack(archivo.read(_CABECERA_CRIBA.size))
+        if firma!=_FIRMA_CRIBA:
+            raise ValueError(f"{ruta} no es un archivo de criba")
+        if limite<=_limite_criba:
+            return _limite_criba
+        # El mapeo es de sólo lectura y lo comparten todos los procesos que carguen el archivo
+        datos=mmap.mmap(archivo.fileno(),0,access=mmap.ACCESS_READ)
+    _primos=memoryview(datos)[_CABECERA_CRIBA.size:].cast('I')
+    _limite_criba=limite
+    return limite
 
 #=======================================
 # Algoritmos para prueba de primalidad
 #=======================================
 
+@instrumentation.instrumentado(o="div")
 def prueba_tentativa(n):
     """
     prueba_tentativa(n): Algoritmo de división por tentativa
@@ -21,6 +127,7 @@ def prueba_tentativa(n):
         o+=1
     return True,o
 
+@instrumentation.instrumentado(o="div")
 def prueba_tentativa2(n):
     """
     prueba_tentativa2(n): Algoritmo de división por tentativa mejorado
@@ -43,8 +150,10 @@ def fermat_witness(n,witness):
              witness es el testigo, i.e. un a tal que calculamos a^{n-1} mod n
     Salida:  booleana (True si n es pseudo-primo de Fermat base a, False si es compuesto)
     """
+    instrumentation.contar("pow")
     return True if pow(witness,n-1,n)==1 else False
 
+@instrumentation.instrumentado
 def fermat(n,trials):
     """
     fermat(n,trials): Prueba de primalidad de Fermat
@@ -82,10 +191,13 @@ def miller_rabin_witness(n,witness):
         d//=2
     # Verificar las congruencias sin potencia de 2
     x=pow(witness,d,n)
+    instrumentation.contar("pow")
     if(x!=1 and x!=n-1):
         for _ in range(s-1):
-            # Verificar las congruencias con potencia de 2
-            x=pow(x,2,n)
+            # Verificar las congruencias con potencia de 2; un cuadrado es una
+            # multiplicación, sin el costo de llamar a pow
+            x=x*x%n
+            instrumentation.contar("mulmod")
             if(x==n-1):
                 break
         else:
@@ -94,6 +206,7 @@ def miller_rabin_witness(n,witness):
     # Alguna congruencia se cumple, n es pseudo-primo fuerte
     return True
 
+@instrumentation.instrumentado
 def miller_rabin(n,trials):
     """
     miller_rabin(n,trials): Prueba de primalidad de Miller-Rabin
@@ -120,10 +233,228 @@ def miller_rabin(n,trials):
     # Todos los a probados son testigos
     return True
 
+# Bases deterministas de Miller-Rabin: (cota, bases) tales que basta probar
+# las bases para todo n menor que la cota
+BASES_DETERMINISTAS=[(2047,(2,)),
+                     (1373653,(2,3)),
+                     (25326001,(2,3,5)),
+                     (3215031751,(2,3,5,7)),
+                     (2152302898747,(2,3,5,7,11)),
+                     (3474749660383,(2,3,5,7,11,13)),
+                     (341550071728321,(2,3,5,7,11,13,17)),
+                     (3825123056546413051,(2,3,5,7,11,13,17,19,23)),
+                     (318665857834031151167461,(2,3,5,7,11,13,17,19,23,29,31,37)),
+                     (3317044064679887385961981,(2,3,5,7,11,13,17,19,23,29,31,37,41))]
+
+def descomposicion_2sd(n):
+    """
+    descomposicion_2sd(n): Descomposición n-1=2^s d con d impar
+    Entrada: un entero impar n>2
+    Salida:  los enteros s y d
+    """
+    d=n-1
+    s=(d&-d).bit_length()-1
+    return s,d>>s
+
+def miller_rabin_fuerte(n,witness,s,d):
+    """
+    miller_rabin_fuerte(n,witness,s,d): Prueba de Miller-Rabin con descomposición precalculada
+    Entrada: n es un entero impar que queremos verificar es primo
+             witness es el testigo a
+             s y d cumplen n-1=2^s d (ver descomposicion_2sd)
+    Salida:  booleana (True si n es pseudo-primo fuerte base a, False si es compuesto)
+    """
+    x=pow(witness,d,n)
+    instrumentation.contar("pow")
+    if x==1 or x==n-1:
+        return True
+    for _ in range(s-1):
+        # Elevar al cuadrado con una multiplicación en lugar de pow(x,2,n)
+        x=x*x%n
+        instrumentation.contar("mulmod")
+        if x==n-1:
+            return True
+    return False
+
+def jacobi(a,n):
+    """
+    jacobi(a,n): Símbolo de Jacobi (a/n)
+    Entrada: a es un entero y n es un entero impar positivo
+    Salida:  -1, 0 o 1
+    """
+    a%=n
+    j=1
+    while(a!=0):
+        while(a%2==0):
+            a//=2
+            if n%8 in (3,5):
+                j=-j
+        # Reciprocidad cuadrática
+        a,n=n,a
+        if a%4==3 and n%4==3:
+            j=-j
+        a%=n
+    return j if n==1 else 0
+
+def lucas_fuerte(n):
+    """
+    lucas_fuerte(n): Prueba fuerte de Lucas con parámetros de Selfridge
+    Entrada: un entero impar n>2 que no es cuadrado perfecto
+    Salida:  booleana (True si n es pseudo-primo fuerte de Lucas, False si es compuesto)
+    """
+
+    # Primer D de 5,-7,9,-11,... con (D/n)=-1
+    D=5
+    while(True):
+        j=jacobi(D,n)
+        if j==-1:
+            break
+        if j==0 and abs(D)!=n:
+            return False
+        D=-D-2 if D>0 else -D+2
+    P,Q=1,(1-D)//4
+    # Expresar a n+1=2^s d
+    d=n+1
+    s=(d&-d).bit_length()-1
+    d>>=s
+    # Calcular U_d y V_d mod n recorriendo los bits de d
+    U,V,Qk=1,P,Q%n
+    for bit in bin(d)[3:]:
+        U,V=U*V%n,(V*V-2*Qk)%n
+        Qk=Qk*Qk%n
+        if bit=='1':
+            # U_{k+1}=(P U_k+V_k)/2 y V_{k+1}=(D U_k+P V_k)/2, dividiendo entre 2 mod n
+            U,V=(P*U+V)%n,(D*U+P*V)%n
+            U=(U+n if U&1 else U)>>1
+            V=(V+n if V&1 else V)>>1
+            Qk=Qk*Q%n
+    if U==0 or V==0:
+        return True
+    for _ in range(s-1):
+        V=(V*V-2*Qk)%n
+        Qk=Qk*Qk%n
+        if V==0:
+            return True
+    return False
+
+@instrumentation.instrumentado
+def baillie_psw(n):
+    """
+    baillie_psw(n): Prueba de primalidad de Baillie-PSW
+    Entrada: n es un entero que queremos verificar es primo
+    Salida:  booleana (True si n es primo probable, False si es compuesto; no se
+             conoce ningún compuesto que pase la prueba)
+    """
+    if n<2:
+        return False
+    if n%2==0:
+        return n==2
+    if n==3:
+        return True
+    s,d=descomposicion_2sd(n)
+    if not miller_rabin_fuerte(n,2,s,d):
+        return False
+    # Los cuadrados perfectos nunca tienen (D/n)=-1
+    if math.isqrt(n)**2==n:
+        return False
+    return lucas_fuerte(n)
+
+# Producto de los primos pequeños, para descartarlos con un solo máximo común divisor
+PRODUCTO_PRIMOS_PEQUENOS=math.prod(PRIMOS_PEQUENOS)
+
+@instrumentation.instrumentado
+def es_primo(n,modo="auto",criba=True):
+    """
+    es_primo(n,modo="auto",criba=True): Prueba de primalidad sin aleatoriedad
+    Entrada: n es un entero que queremos verificar es primo
+             modo es "determinista" (Miller-Rabin con bases fijas, n<3.3e24),
+             "bpsw" (Baillie-PSW) o "auto" (el primero si aplica, si no el segundo)
+             criba indica si descartar primero divisores primos pequeños
+             (False si el candidato ya viene cribado)
+    Salida:  booleana (True si n es primo, False si es compuesto; en modo
+             Baillie-PSW, True significa primo probable)
+    """
+
+    if n<2:
+        return False
+    if n<=PRIMOS_PEQUENOS[-1]:
+        return n in PRIMOS_PEQUENOS
+    if criba and math.gcd(n,PRODUCTO_PRIMOS_PEQUENOS)!=1:
+        return False
+    if n%2==0:
+        return False
+    if modo=="bpsw" or (modo=="auto" and n>=BASES_DETERMINISTAS[-1][0]):
+        return baillie_psw(n)
+    if modo not in ("auto","determinista"):
+        raise ValueError(f"modo de primalidad desconocido: {modo}")
+    if n>=BASES_DETERMINISTAS[-1][0]:
+        raise ValueError("el modo determinista sólo aplica para n<3317044064679887385961981")
+    # s y d se calculan una sola vez para todas las bases
+    s,d=descomposicion_2sd(n)
+    bases=next(b for cota,b in BASES_DETERMINISTAS if n<cota)
+    return all(miller_rabin_fuerte(n,a,s,d) for a in bases)
+
+@instrumentation.instrumentado
+def clasificar_primos(valores,metodo="criba"):
+    """
+    clasificar_primos(valores,metodo="criba"): Prueba de primalidad vectorizada para muchos enteros
+    Entrada: valores es un array de NumPy o un range de enteros
+             metodo indica qué operaciones contar por valor: "tentativa" (las de
+             prueba_tentativa), "tentativa2" (las de prueba_tentativa2) o "criba"
+             (divisiones entre los primos hasta sqrt(n))
+    Salida:  un array booleano (True si el valor es primo) y un array con las
+             operaciones de cada valor; si algún valor tiene 32 bits o más, la
+             primalidad se decide con es_primo y las operaciones se reportan como -1
+    """
+    import numpy as np
+
+    if isinstance(valores,range):
+        valores=np.arange(valores.start,valores.stop,valores.step,dtype=np.int64)
+    valores=np.asarray(valores)
+    if metodo not in ("tentativa","tentativa2","criba"):
+        raise ValueError(f"método desconocido: {metodo}")
+    if valores.size==0:
+        return np.zeros(0,dtype=bool),np.zeros(0,dtype=np.int64)
+    if valores.dtype==object or int(valores.max())>=1<<32:
+        # Enteros grandes: Miller-Rabin determinista/Baillie-PSW valor por valor
+        primos=np.array([es_primo(int(v)) for v in valores.ravel()],dtype=bool).reshape(valores.shape)
+        return primos,np.full(valores.shape,-1,dtype=np.int64)
+    v=valores.astype(np.int64)
+    # Menor factor primo de cada valor (el valor mismo si es primo), por módulos vectorizados
+    spf=v.copy()
+    indice=np.zeros(v.shape,dtype=np.int64)
+    activos=np.nonzero(v>=4)[0]
+    k=0
+    # Los negativos, 0 y 1 no son primos y no cuentan divisiones: se cortan a 0
+    maximo=max(int(v.max()),0)
+    raiz=np.sqrt(np.maximum(v,0).astype(np.float64))
+    for k,p in enumerate(primos_hasta(math.isqrt(maximo)+1)):
+        activos=activos[v[activos]>=p*p]
+        if activos.size==0:
+            break
+        divide=v[activos]%p==0
+        spf[activos[divide]]=p
+        indice[activos[divide]]=k
+        activos=activos[~divide]
+    primos=(v>=2)&(spf==v)
+    if metodo=="tentativa":
+        o=np.where(v>=2,spf-2,0)
+    elif metodo=="tentativa2":
+        # range(2,round(sqrt(n))) se detiene en el menor factor si éste cae dentro
+        tope=np.maximum(np.rint(raiz).astype(np.int64)-2,0)
+        o=np.where(~primos&(v>=2)&(spf-2<tope),spf-2,tope)
+    else:
+        # Índice del menor factor en la tabla de primos, o cuántos primos hay hasta sqrt(n)
+        tabla=np.frombuffer(array('I',primos_hasta(math.isqrt(maximo)+2)),dtype=np.uint32)
+        pi_raiz=np.searchsorted(tabla,np.floor(raiz).astype(np.int64),side="right")
+        o=np.where(primos|(v<4),pi_raiz,indice+1)
+    return primos,o.astype(np.int64)
+
 #==============================
 # Algoritmos de factorización
 #==============================
 
+@instrumentation.instrumentado(o="div")
 def division_tentativa(n):
     """
     division_tentativa(n): Algoritmo de división por tentativa
@@ -146,6 +477,7 @@ def division_tentativa(n):
         o+=1
     return factores,o
 
+@instrumentation.instrumentado(o="div")
 def division_tentativa2(n):
     """
     division_tentativa2(n): Algoritmo de división por tentativa mejorado
@@ -171,6 +503,7 @@ def division_tentativa2(n):
         factores.append(n)
     return factores,o
 
+@instrumentation.instrumentado(o="div")
 def division_tentativa3(n):
     """
     division_tentativa3(n): Algoritmo de división por tentativa mejorado más
@@ -200,6 +533,7 @@ def division_tentativa3(n):
         factores.append(n) 
     return factores,o
 
+@instrumentation.instrumentado(o="div")
 def division_tentativa_criba(n):
     """
     division_tentativa_criba(n): Algoritmo de división por tentativa con criba de primos
@@ -208,8 +542,8 @@ def division_tentativa_criba(n):
     """
 
     factores=[]
-	# Crea la criba de primos
-    s=[i for i in sieve.primerange(math.sqrt(n))]
+	# Toma los primos hasta sqrt(n) de la criba compartida
+    s=primos_hasta(math.isqrt(n)+1)
     o=0
 	# Verifica para cada primo en la criba si éste es factor
     for i in s:
@@ -221,6 +555,7 @@ def division_tentativa_criba(n):
         factores.append(n)
     return factores,o
 
+@instrumentation.instrumentado
 def division_tentativa_sp(n):
     """
     division_tentativa_sp(n): Algoritmo de división por tentativa para semiprimos
@@ -239,3 +574,917 @@ def division_tentativa_sp(n):
         i+=1
     # n fue primo, después de todo
     return 1,n
+
+def rho_brent(n,c=1,m=128,hasta=None):
+    """
+    rho_brent(n,c=1,m=128,hasta=None): Un paso de Pollard rho con la variante de Brent
+    Entrada: n es un entero compuesto impar
+             c es la constante del polinomio x^2+c
+             m es la cantidad de diferencias acumuladas antes de cada mcd
+             hasta es el instante límite según time.perf_counter (default: None, i.e. sin límite)
+    Salida:  un divisor g de n (g==n si el intento fracasó, g==1 si se agotó el
+             tiempo) y las operaciones hechas
+    """
+
+    y,r,q,g=2,1,1,1
+    o=0
+    while(g==1):
+        if hasta is not None and time.perf_counter()>hasta:
+            return 1,o
+        x=y
+        for _ in range(r):
+            y=(y*y+c)%n
+            o+=1
+        k=0
+        while(k<r and g==1):
+            if hasta is not None and time.perf_counter()>hasta:
+                return 1,o
+            ys=y
+            # Acumular el producto de |x-y| y sacar un solo mcd por bloque
+            for _ in range(min(m,r-k)):
+                y=(y*y+c)%n
+                q=q*abs(x-y)%n
+                o+=2
+            g=math.gcd(q,n)
+            k+=m
+        r*=2
+    if g==n:
+        # El bloque mezcló todos los factores, repetirlo paso a paso
+        while(True):
+            ys=(ys*ys+c)%n
+            o+=1
+            g=math.gcd(abs(x-ys),n)
+            if g>1:
+                break
+    return g,o
+
+@instrumentation.instrumentado(o="mulmod")
+def pollard_rho(n):
+    """
+    pollard_rho(n): Algoritmo rho de Pollard (variante de Brent)
+    Entrada: un entero n
+    Salida:  un array con los factores primos de n
+    """
+
+    factores=[]
+    o=0
+    pendientes=[n]
+    while(pendientes):
+        m=pendientes.pop()
+        if m==1:
+            continue
+        if es_primo(m):
+            factores.append(m)
+            continue
+        if m%2==0:
+            factores.append(2)
+            pendientes.append(m//2)
+            o+=1
+            continue
+        # Cambiar de polinomio hasta separar a m
+        c=1
+        while(True):
+            g,oi=rho_brent(m,c)
+            o+=oi
+            if g!=m:
+                break
+            c+=1
+        pendientes+=[g,m//g]
+    factores.sort()
+    return factores,o
+
+def p_menos_1(n,B1=10000,B2=None,a=2):
+    """
+    p_menos_1(n,B1=10000,B2=None,a=2): Un intento de Pollard p-1 con dos etapas
+    Entrada: n es un entero compuesto impar
+             B1 es la cota de la etapa 1 (potencias de primos hasta B1)
+             B2 es la cota de la etapa 2 (un primo extra hasta B2; default: 100*B1)
+             a es la base
+    Salida:  un divisor g de n (g==1 o g==n si el intento fracasó) y las operaciones hechas
+    """
+
+    if B2 is None:
+        B2=100*B1
+    primos=primos_hasta(max(B1,B2)+1)
+    o=0
+    # Etapa 1: a^M con M el producto de las potencias de primos hasta B1
+    potencias=[]
+    for p in primos:
+        if p>B1:
+            break
+        pe=p
+        while(pe*p<=B1):
+            pe*=p
+        potencias.append(pe)
+    for ini in range(0,len(potencias),64):
+        guardado=a
+        for pe in potencias[ini:ini+64]:
+            a=pow(a,pe,n)
+            o+=pe.bit_length()
+        g=math.gcd(a-1,n)
+        if g==n:
+            # Rehacer el bloque potencia a potencia para no perder el factor
+            a=guardado
+            for pe in potencias[ini:ini+64]:
+                a=pow(a,pe,n)
+                o+=pe.bit_length()
+                g=math.gcd(a-1,n)
+                if g!=1:
+                    return g,o
+        if g!=1:
+            return g,o
+    # Etapa 2: a^{Mq} para cada primo B1<q<=B2, avanzando con las diferencias entre primos
+    etapa2=[p for p in primos if B1<p<=B2]
+    if not etapa2:
+        return 1,o
+    saltos={}
+    b=pow(a,etapa2[0],n)
+    q=b-1
+    for anterior,p in zip(etapa2,etapa2[1:]):
+        salto=p-anterior
+        if salto not in saltos:
+            saltos[salto]=pow(a,salto,n)
+        b=b*saltos[salto]%n
+        q=q*(b-1)%n
+        o+=2
+    return math.gcd(q,n),o
+
+@instrumentation.instrumentado(o="mulmod")
+def pollard_p_menos_1(n,B1=10000,B2=None):
+    """
+    pollard_p_menos_1(n,B1=10000,B2=None): Algoritmo p-1 de Pollard
+    Entrada: n es un entero
+             B1 y B2 son las cotas de las etapas 1 y 2 (ver p_menos_1)
+    Salida:  un array con los factores de n; los que no se lograron separar
+             se dejan compuestos
+    """
+
+    factores=[]
+    o=0
+    pendientes=[n]
+    while(pendientes):
+        m=pendientes.pop()
+        if m==1:
+            continue
+        if m%2==0:
+            factores.append(2)
+            pendientes.append(m//2)
+            o+=1
+            continue
+        if es_primo(m):
+            factores.append(m)
+            continue
+        g,oi=p_menos_1(m,B1,B2)
+        o+=oi
+        if g==1 or g==m:
+            factores.append(m)
+        else:
+            pendientes+=[g,m//g]
+    factores.sort()
+    return factores,o
+
+def raiz_entera(n,k):
+    """
+    raiz_entera(n,k): Raíz k-ésima entera
+    Entrada: n y k son enteros positivos
+    Salida:  el mayor entero r con r^k<=n
+    """
+    if n<2:
+        return n
+    # Newton desde una aproximación por arriba
+    r=1<<-(-n.bit_length()//k)
+    while(True):
+        s=((k-1)*r+n//r**(k-1))//k
+        if s>=r:
+            return r
+        r=s
+
+def potencia_perfecta(n):
+    """
+    potencia_perfecta(n): Detecta si n=b^k con k>1
+    Entrada: un entero n>1
+    Salida:  el par (b,k) con k máximo, o None si n no es potencia perfecta
+    """
+    for k in reversed(criba_eratostenes(n.bit_length()+1)):
+        b=raiz_entera(n,k)
+        if b>1 and b**k==n:
+            base=potencia_perfecta(b)
+            return (base[0],base[1]*k) if base else (b,k)
+    return None
+
+#==============================================
+# Método de curvas elípticas de Lenstra (ECM)
+#==============================================
+
+# Parámetros por tamaño del factor buscado, como en GMP-ECM:
+# (dígitos del factor, B1, cantidad de curvas)
+PARAMETROS_ECM=[(15,2000,25),
+                (20,11000,90),
+                (25,50000,300),
+                (30,250000,700),
+                (35,1000000,1800)]
+
+# Potencias de primos de la etapa 1 y su producto, por cota B1
+_productos_etapa1={}
+
+def _producto(valores):
+    # Producto por mitades, para multiplicar enteros de tamaños parecidos
+    if len(valores)<=16:
+        return math.prod(valores)
+    mitad=len(valores)//2
+    return _producto(valores[:mitad])*_producto(valores[mitad:])
+
+def _producto_etapa1(B1):
+    # Las potencias p^e<=B1 y k=prod p^e, calculados una sola vez por cota
+    if B1 not in _productos_etapa1:
+        potencias=[]
+        for p in primos_hasta(B1+1):
+            pe=p
+            while(pe*p<=B1):
+                pe*=p
+            potencias.append(pe)
+        _productos_etapa1[B1]=potencias,_producto(potencias)
+    return _productos_etapa1[B1]
+
+def _ecm_duplicar(X,Z,n,a24):
+    # 2P en coordenadas (X:Z) de la curva de Montgomery, con a24=(A+2)/4
+    s=(X+Z)*(X+Z)%n
+    d=(X-Z)*(X-Z)%n
+    t=s-d
+    return s*d%n,t*(d+a24*t)%n
+
+def _ecm_sumar(X1,Z1,X2,Z2,Xd,Zd,n):
+    # P+Q en coordenadas (X:Z) conociendo la diferencia P-Q=(Xd:Zd)
+    u=(X1-Z1)*(X2+Z2)%n
+    v=(X1+Z1)*(X2-Z2)%n
+    return Zd*(u+v)*(u+v)%n,Xd*(u-v)*(u-v)%n
+
+def _ecm_escalar(k,X,Z,n,a24):
+    # Escalera de Montgomery: kP con una suma y una duplicación por bit
+    X0,Z0=X,Z
+    X1,Z1=_ecm_duplicar(X,Z,n,a24)
+    for bit in bin(k)[3:]:
+        if bit=="1":
+            X0,Z0=_ecm_sumar(X1,Z1,X0,Z0,X,Z,n)
+            X1,Z1=_ecm_duplicar(X1,Z1,n,a24)
+        else:
+            X1,Z1=_ecm_sumar(X1,Z1,X0,Z0,X,Z,n)
+            X0,Z0=_ecm_duplicar(X0,Z0,n,a24)
+    return X0,Z0
+
+def ecm_curva(n,sigma,B1=2000,B2=None):
+    """
+    ecm_curva(n,sigma,B1=2000,B2=None): Un intento de ECM con una curva
+    Entrada: n es un entero compuesto impar sin factores primos pequeños
+             sigma es el parámetro de Suyama de la curva (6<=sigma<n-1)
+             B1 es la cota de la etapa 1 (potencias de primos hasta B1)
+             B2 es la cota de la etapa 2 (un primo extra hasta B2; default: 100*B1)
+    Salida:  un divisor g de n (g==1 o g==n si el intento fracasó) y las operaciones hechas
+    """
+
+    if B2 is None:
+        B2=100*B1
+    # Curva de Suyama: u=sigma^2-5, v=4sigma, P=(u^3:v^3) y a24=(v-u)^3(3u+v)/(16u^3v)
+    u=(sigma*sigma-5)%n
+    v=4*sigma%n
+    X,Z=pow(u,3,n),pow(v,3,n)
+    denominador=16*X*v%n
+    g=math.gcd(denominador,n)
+    if g!=1:
+        return g,0
+    a24=pow(v-u,3,n)*(3*u+v)*pow(denominador,-1,n)%n
+    # Etapa 1: Q=kP con k el producto de las potencias de primos hasta B1
+    potencias,k=_producto_etapa1(B1)
+    P=X,Z
+    X,Z=_ecm_escalar(k,X,Z,n,a24)
+    o=11*k.bit_length()
+    g=math.gcd(Z,n)
+    if g==n:
+        # El orden del punto divide a k módulo todos los factores: rehacer la etapa
+        # por bloques y cada bloque potencia a potencia, como en p_menos_1
+        X,Z=P
+        for ini in range(0,len(potencias),64):
+            guardado=X,Z
+            X,Z=_ecm_escalar(_producto(potencias[ini:ini+64]),X,Z,n,a24)
+            g=math.gcd(Z,n)
+            if g==n:
+                X,Z=guardado
+                for pe in potencias[ini:ini+64]:
+                    X,Z=_ecm_escalar(pe,X,Z,n,a24)
+                    o+=11*pe.bit_length()
+                    g=math.gcd(Z,n)
+                    if g!=1:
+                        return g,o
+            if g!=1:
+                return g,o
+    if g!=1 or B2<=B1:
+        return g,o
+    # Etapa 2 (pasos de bebé y de gigante): cada primo B1<q<=B2 se escribe como
+    # q=mD±j con |j|<D/2 y mcd(j,D)=1, y (mD)Q y jQ tienen la misma coordenada x
+    # sólo si qQ es el punto al infinito módulo algún factor de n
+    D=2310 if B2>=100*2310 else 210
+    # Pasos de bebé: los múltiplos impares jQ, normalizados a x_j=X_j/Z_j
+    X2,Z2=_ecm_duplicar(X,Z,n,a24)
+    impares=[(X,Z),_ecm_sumar(X2,Z2,X,Z,X,Z,n)]
+    for _ in range(D//4):
+        impares.append(_ecm_sumar(*impares[-1],X2,Z2,*impares[-2],n))
+    j_coprimos=[j for j in range(1,D//2,2) if math.gcd(j,D)==1]
+    # Una sola inversión para todas las Z_j (truco de Montgomery)
+    prefijos=[1]
+    for j in j_coprimos:
+        prefijos.append(prefijos[-1]*impares[j//2][1]%n)
+    g=math.gcd(prefijos[-1],n)
+    if g!=1:
+        return g,o
+    inverso=pow(prefijos[-1],-1,n)
+    x={}
+    for i in range(len(j_coprimos)-1,-1,-1):
+        Xj,Zj=impares[j_coprimos[i]//2]
+        x[j_coprimos[i]]=Xj*inverso*prefijos[i]%n
+        inverso=inverso*Zj%n
+    o+=11*D//4+3*len(j_coprimos)
+    # Pasos de gigante: R_m=(mD)Q, avanzando con R_{m+1}=R_m+DQ y diferencia R_{m-1}
+    primos=primos_hasta(B2+1)
+    # Los primos que dividen a D no se escriben como mD±j con mcd(j,D)=1
+    primos=primos[bisect.bisect_right(primos,max(B1,11)):]
+    if not primos:
+        return 1,o
+    XD,ZD=_ecm_escalar(D,X,Z,n,a24)
+    m=(primos[0]+D//2)//D
+    R=_ecm_escalar(m,XD,ZD,n,a24)
+    siguiente=_ecm_escalar(m+1,XD,ZD,n,a24)
+    o+=11*(D.bit_length()+2*m.bit_length())
+    acumulado=1
+    for q in primos:
+        while(q>m*D+D//2):
+            R,siguiente=siguiente,_ecm_sumar(*siguiente,XD,ZD,*R,n)
+            m+=1
+            o+=6
+        XR,ZR=R
+        acumulado=acumulado*(XR-x[abs(q-m*D)]*ZR)%n
+        o+=2
+    return math.gcd(acumulado,n),o
+
+def _ecm_lote(n,sigmas,B1,B2):
+    # Varias curvas seguidas en un proceso hijo; se detiene en el primer factor
+    o=0
+    for sigma in sigmas:
+        g,oi=ecm_curva(n,sigma,B1,B2)
+        o+=oi
+        if 1<g<n:
+            return g,o
+    return 1,o
+
+def ecm(n,B1=None,curvas=None,B2=None,workers=None,hasta=None,semilla=None):
+    """
+    ecm(n,B1=None,curvas=None,B2=None,workers=None,hasta=None,semilla=None): Busca un factor de n con curvas independientes
+    Entrada: n es un entero compuesto impar sin factores primos pequeños
+             B1 y curvas son la cota de la etapa 1 y la cantidad de curvas
+             (default: None, i.e. subir por los niveles de PARAMETROS_ECM)
+             B2 es la cota de la etapa 2 (default: 100*B1)
+             workers es la cantidad de procesos (default: None, i.e. en serie); al
+             hallar un factor ya no se reparten más curvas
+             hasta es el instante límite según time.perf_counter (default: None, i.e. sin límite)
+             semilla fija los parámetros sigma de las curvas
+    Salida:  un divisor g de n (g==1 si ninguna curva lo separó) y las operaciones hechas
+    """
+
+    niveles=[(B1,curvas or 1)] if B1 is not None else [(b,c) for _,b,c in PARAMETROS_ECM]
+    rng=random.Random(semilla)
+    # Una tarea por curva, en el orden de los niveles
+    tareas=((b,B2 or 100*b,rng.randrange(6,n-1)) for b,c in niveles for _ in range(c))
+    o=0
+    if workers is None or workers<=1:
+        for b,b2,sigma in tareas:
+            if hasta is not None and time.perf_counter()>hasta:
+                break
+            g,oi=ecm_curva(n,sigma,b,b2)
+            o+=oi
+            if 1<g<n:
+                return g,o
+        return 1,o
+    from concurrent.futures import ProcessPoolExecutor,wait,FIRST_COMPLETED
+    pool=ProcessPoolExecutor(max_workers=workers)
+    try:
+        pendientes=set()
+        for b,b2,sigma in tareas:
+            if len(pendientes)>=workers:
+                espera=None if hasta is None else max(0,hasta-time.perf_counter())
+                listos,pendientes=wait(pendientes,timeout=espera,return_when=FIRST_COMPLETED)
+                for f in listos:
+                    g,oi=f.result()
+                    o+=oi
+                    if 1<g<n:
+                        return g,o
+                if hasta is not None and time.perf_counter()>hasta:
+                    return 1,o
+            pendientes.add(pool.submit(_ecm_lote,n,[sigma],b,b2))
+        for f in wait(pendientes,timeout=None if hasta is None else max(0,hasta-time.perf_counter()))[0]:
+            g,oi=f.result()
+            o+=oi
+            if 1<g<n:
+                return g,o
+        return 1,o
+    finally:
+        # Las curvas que ya corren terminan solas; las encoladas se cancelan
+        pool.shutdown(wait=False,cancel_futures=True)
+
+@instrumentation.instrumentado(o="mulmod")
+def lenstra_ecm(n,B1=None,workers=None):
+    """
+    lenstra_ecm(n,B1=None,workers=None): Método de curvas elípticas de Lenstra
+    Entrada: n es un entero
+             B1 es la cota de la etapa 1 (default: None, i.e. subir por PARAMETROS_ECM)
+             workers es la cantidad de procesos que prueban curvas
+    Salida:  un array con los factores de n; los que no se lograron separar
+             se dejan compuestos
+    """
+
+    factores=[]
+    o=0
+    pendientes=[n]
+    while(pendientes):
+        m=pendientes.pop()
+        if m==1:
+            continue
+        # ECM necesita un cofactor impar y sin factores pequeños
+        p=next((p for p in PRIMOS_PEQUENOS if m%p==0),None)
+        if p is not None:
+            factores.append(p)
+            pendientes.append(m//p)
+            o+=1
+            continue
+        if es_primo(m):
+            factores.append(m)
+            continue
+        potencia=potencia_perfecta(m)
+        if potencia is not None:
+            pendientes+=[potencia[0]]*potencia[1]
+            continue
+        g,oi=ecm(m,B1,curvas=None if B1 is None else 50,workers=workers)
+        o+=oi
+        if g==1:
+            factores.append(m)
+        else:
+            pendientes+=[g,m//g]
+    factores.sort()
+    return factores,o
+
+#==========================================
+# Criba cuadrática autoinicializada (SIQS)
+#==========================================
+
+# Parámetros por cantidad de dígitos: (dígitos, tamaño de la base de factores, M)
+# donde la criba recorre x en [-M,M)
+PARAMETROS_SIQS=[(30,200,32768),
+                 (40,400,65536),
+                 (50,1200,65536),
+                 (60,2500,98304),
+                 (70,4500,131072),
+                 (80,7000,196608),
+                 (90,12000,262144),
+                 (100,20000,393216)]
+
+# Multiplicadores libres de cuadrados que prueba Knuth-Schroeppel
+MULTIPLICADORES=[1,3,5,7,11,13,15,17,19,21,23,29,31,33,35,37,39,41,43,47,51,53,55,57,59,61,65,67,69,71,73]
+
+def raiz_cuadrada_modular(a,p):
+    """
+    raiz_cuadrada_modular(a,p): Algoritmo de Tonelli-Shanks
+    Entrada: a es un residuo cuadrático módulo el primo impar p
+    Salida:  un entero t con t^2=a mod p
+    """
+    a%=p
+    if a==0:
+        return 0
+    if p%4==3:
+        return pow(a,(p+1)//4,p)
+    # Expresar a p-1=2^s q y buscar un no residuo z
+    s,q=descomposicion_2sd(p)
+    z=2
+    while(pow(z,(p-1)//2,p)!=p-1):
+        z+=1
+    m,c,t,r=s,pow(z,q,p),pow(a,q,p),pow(a,(q+1)//2,p)
+    while(t!=1):
+        i,t2=0,t
+        while(t2!=1):
+            t2=t2*t2%p
+            i+=1
+        b=pow(c,1<<(m-i-1),p)
+        m,c=i,b*b%p
+        t,r=t*c%p,r*b%p
+    return r
+
+def multiplicador_knuth_schroeppel(n):
+    """
+    multiplicador_knuth_schroeppel(n): Elección del multiplicador de la criba cuadrática
+    Entrada: un entero impar n
+    Salida:  el multiplicador k que maximiza la contribución esperada de los
+             primos pequeños en la criba de k*n
+    """
+    mejor,k_mejor=None,1
+    for k in MULTIPLICADORES:
+        kn=k*n
+        puntaje=-0.5*math.log(k)
+        if kn%8==1:
+            puntaje+=2*math.log(2)
+        elif kn%8==5:
+            puntaje+=math.log(2)
+        elif kn%4==3:
+            puntaje+=0.5*math.log(2)
+        for p in PRIMOS_PEQUENOS[1:100]:
+            if k%p==0:
+                puntaje+=math.log(p)/p
+            elif pow(kn%p,(p-1)//2,p)==1:
+                puntaje+=2*math.log(p)/(p-1)
+        if mejor is None or puntaje>mejor:
+            mejor,k_mejor=puntaje,k
+    return k_mejor
+
+def _siqs_base(n,kn,F):
+    # Base de factores de k*n: primos p con (kn/p)=1 (o p|k), sus raíces y logaritmos.
+    # Regresa un factor de n si alguno de los primos lo divide
+    base,raices=[2],[kn%2]
+    limite=max(1000,int(F*math.log(F)*3))
+    while(len(base)<F):
+        for p in primos_hasta(limite)[1:]:
+            if len(base)>=F:
+                break
+            if p<=base[-1]:
+                continue
+            if n%p==0:
+                return p
+            r=kn%p
+            if r==0 or pow(r,(p-1)//2,p)==1:
+                base.append(p)
+                raices.append(raiz_cuadrada_modular(r,p))
+        limite*=2
+    return base,raices
+
+def _siqs_elegir_a(base,objetivo,rng):
+    # Producto A de s primos de tamaño medio de la base, cercano a objetivo=sqrt(2kn)/M;
+    # se prueba primero con menos primos y luego con más que la estimación inicial
+    s0=max(2,round(math.log(objetivo)/math.log(2000)))
+    for s in [*range(s0,1,-1),*range(s0+1,s0+8)]:
+        ideal=objetivo**(1/s)
+        candidatos=[i for i,p in enumerate(base) if ideal/2<p<ideal*2 and p>50]
+        if len(candidatos)>=s+2:
+            break
+    else:
+        # Ningún tamaño de A tiene primos cerca del ideal: tomar los más cercanos
+        s=s0
+        ideal=objetivo**(1/s)
+        candidatos=sorted((i for i,p in enumerate(base) if p>50),key=lambda i: abs(math.log(base[i]/ideal)))[:s+2]
+    indices=rng.sample(candidatos,s-1)
+    A=math.prod(base[i] for i in indices)
+    # El último primo ajusta A al objetivo
+    resto=objetivo//A
+    ultimo=min((i for i,p in enumerate(base) if p>50 and i not in indices),key=lambda i: abs(base[i]-resto))
+    indices.append(ultimo)
+    return A*base[ultimo],sorted(indices)
+
+def _siqs_lote(n,kn,base,raices,M,umbral,semilla):
+    """
+    _siqs_lote(n,kn,base,raices,M,umbral,semilla): Criba de todos los polinomios de un coeficiente A
+    ---
+    Entrada: n es el entero a factorizar y kn=k*n
+             base y raices son la base de factores y las raíces de kn módulo cada primo
+             M es la mitad del intervalo de criba
+             umbral es el logaritmo mínimo de un candidato
+             semilla inicializa la elección aleatoria de A
+
+    Salida:  relaciones completas y parciales como (u,exponentes,primo grande), con
+             u^2-kn=(-1)^{e_0} prod base[j-1]^{e_j} * primo grande, y las posiciones cribadas
+    """
+    import numpy as np
+
+    rng=random.Random(semilla)
+    objetivo=math.isqrt(2*kn)//M
+    A,indices_a=_siqs_elegir_a(base,objetivo,rng)
+    P=np.array(base,dtype=np.int64)
+    logs=np.array([round(math.log2(p)) for p in base],dtype=np.uint8)
+    # B_l=(A/q_l)*(t_l*(A/q_l)^{-1} mod q_l) cumple B^2=kn mod A para B=sum B_l
+    Bl=[]
+    for i in indices_a:
+        q=base[i]
+        aq=A//q
+        gamma=raices[i]*pow(aq,-1,q)%q
+        if gamma>q//2:
+            gamma=q-gamma
+        Bl.append(aq*gamma)
+    B=sum(Bl)
+    # Raíces de (Ax+B)^2=kn mod p y los incrementos 2 B_l A^{-1} mod p para el código de Gray
+    valido=np.ones(len(base),dtype=bool)
+    valido[indices_a]=False
+    valido[0]=False
+    ainv=np.zeros(len(base),dtype=np.int64)
+    soln1=np.zeros(len(base),dtype=np.int64)
+    soln2=np.zeros(len(base),dtype=np.int64)
+    incrementos=[np.zeros(len(base),dtype=np.int64) for _ in Bl]
+    for j,p in enumerate(base):
+        if not valido[j]:
+            continue
+        ai=pow(A%p,-1,p)
+        ainv[j]=ai
+        soln1[j]=ai*(raices[j]-B)%p
+        soln2[j]=ai*(-raices[j]-B)%p
+        for l,b in enumerate(Bl):
+            incrementos[l][j]=2*(b%p)*ai%p
+    # Los primos muy pequeños casi no aportan y cuestan mucho cribarlos
+    cribar=[j for j in range(len(base)) if valido[j] and base[j]>=30]
+    primo_grande=base[-1]*128
+    completas,parciales=[],[]
+    o=0
+    signos=[1]*len(Bl)
+    for i in range(1<<(len(Bl)-1)):
+        if i>0:
+            # Código de Gray: cambiar el signo de un solo B_l por polinomio
+            l=(i&-i).bit_length()
+            signos[l]=-signos[l]
+            B+=2*signos[l]*Bl[l]
+            soln1=(soln1-signos[l]*incrementos[l])%P
+            soln2=(soln2-signos[l]*incrementos[l])%P
+        r1=((soln1+M)%P).tolist()
+        r2=((soln2+M)%P).tolist()
+        criba=np.zeros(2*M,dtype=np.uint8)
+        for j in cribar:
+            p=base[j]
+            criba[r1[j]::p]+=logs[j]
+            if r2[j]!=r1[j]:
+                criba[r2[j]::p]+=logs[j]
+        o+=2*M
+        R1=np.array(r1,dtype=np.int64)
+        R2=np.array(r2,dtype=np.int64)
+        for x in np.nonzero(criba>=umbral)[0].tolist():
+            u=A*(x-M)+B
+            f=(u*u-kn)//A
+            exponentes={}
+            if f<0:
+                exponentes[0]=1
+                f=-f
+            for j in indices_a:
+                exponentes[j+1]=1
+            # Sólo se prueban los primos cuyas raíces caen en x, más 2 y los primos de A
+            divisores=np.nonzero(((x-R1)%P==0)|((x-R2)%P==0))[0].tolist()
+            for j in [0]+indices_a+divisores:
+                p=base[j]
+                while(f%p==0):
+                    f//=p
+                    exponentes[j+1]=exponentes.get(j+1,0)+1
+            if f==1:
+                completas.append((u,exponentes,1))
+            elif f<primo_grande:
+                parciales.append((u,exponentes,f))
+    return completas,parciales,o
+
+def _siqs_dependencias(filas,columnas):
+    """
+    _siqs_dependencias(filas,columnas): Dependencias lineales sobre GF(2)
+    ---
+    Entrada: filas es una lista de enteros, cada uno con los bits de paridad de una relación
+             columnas es la cantidad de bits posibles
+
+    Salida:  un generador de enteros cuyos bits marcan conjuntos de filas que suman cero
+    """
+
+    # Eliminación estructurada: descartar filas con columnas que sólo aparecen una vez
+    activas=set(range(len(filas)))
+    while(True):
+        cuenta=[0]*columnas
+        for i in activas:
+            r=filas[i]
+            while(r):
+                b=r&-r
+                cuenta[b.bit_length()-1]+=1
+                r^=b
+        solitarias=sum(1<<c for c in range(columnas) if cuenta[c]==1)
+        quitar={i for i in activas if filas[i]&solitarias}
+        if not quitar:
+            break
+        activas-=quitar
+    # Eliminación gaussiana con filas empacadas en enteros y su historial de combinaciones
+    pivotes={}
+    for i in sorted(activas):
+        r,h=filas[i],1<<i
+        while(r):
+            alto=r.bit_length()-1
+            if alto not in pivotes:
+                pivotes[alto]=(r,h)
+                break
+            pr,ph=pivotes[alto]
+            r^=pr
+            h^=ph
+        else:
+            yield h
+
+def _guardar_relaciones(ruta,clave,relaciones,parciales,o):
+    # Punto de control de la criba: se escribe aparte y luego reemplaza al anterior
+    with open(ruta+".tmp","wb") as archivo:
+        pickle.dump({"clave":clave,"relaciones":relaciones,"parciales":parciales,"o":o},archivo)
+    os.replace(ruta+".tmp",ruta)
+
+@instrumentation.instrumentado(o="criba")
+def criba_cuadratica(n,workers=None,parametros=None,checkpoint=None,intervalo=60.0):
+    """
+    criba_cuadratica(n,workers=None,parametros=None,checkpoint=None,intervalo=60.0): Criba cuadrática autoinicializada
+    Entrada: n es un entero compuesto impar sin factores primos pequeños
+             workers es la cantidad de procesos que criban lotes de polinomios
+             (default: None, i.e. en serie)
+             parametros es un par (tamaño de la base de factores, M) para
+             reemplazar los de PARAMETROS_SIQS
+             checkpoint es un archivo donde guardar las relaciones encontradas
+             cada intervalo segundos; si existe, la criba se reanuda desde él
+    Salida:  un array con dos factores de n y las posiciones cribadas (para n de
+             menos de 64 bits, los factores primos de pollard_rho); si ninguna
+             dependencia separa a n se siguen juntando relaciones, así que no
+             regresa hasta lograrlo
+    """
+
+    # Para enteros chicos la criba no compensa su inicialización
+    if n.bit_length()<64:
+        return pollard_rho(n)
+    raiz=math.isqrt(n)
+    if raiz*raiz==n:
+        return [raiz,raiz],0
+    digitos=len(str(n))
+    if parametros is None:
+        parametros=next(((F,M) for d,F,M in PARAMETROS_SIQS if digitos<=d),PARAMETROS_SIQS[-1][1:])
+    F,M=parametros
+    k=multiplicador_knuth_schroeppel(n)
+    kn=k*n
+    base=_siqs_base(n,kn,F)
+    if isinstance(base,int):
+        return sorted([base,n//base]),0
+    base,raices=base
+    # Un candidato debe tener casi todo su tamaño en primos de la base
+    umbral=int(math.log2(M*math.isqrt(kn))-2*math.log2(base[-1])-4)
+    rng=random.Random()
+    relaciones={}
+    parciales={}
+    necesarias=len(base)+20
+    o=0
+    if checkpoint is not None and os.path.exists(checkpoint):
+        with open(checkpoint,"rb") as archivo:
+            estado=pickle.load(archivo)
+        if estado["clave"]!=(n,k,F,M):
+            raise ValueError(f"{checkpoint} es de otra criba")
+        relaciones,parciales,o=estado["relaciones"],estado["parciales"],estado["o"]
+    guardado=time.monotonic()
+    pool=None
+    if workers is not None and workers>1:
+        from concurrent.futures import ProcessPoolExecutor
+        pool=ProcessPoolExecutor(max_workers=workers)
+    try:
+        while(True):
+            while(len(relaciones)<necesarias):
+                if pool is None:
+                    lotes=[_siqs_lote(n,kn,base,raices,M,umbral,rng.getrandbits(64))]
+                else:
+                    lotes=pool.map(_siqs_lote,*zip(*[(n,kn,base,raices,M,umbral,rng.getrandbits(64)) for _ in range(workers)]))
+                for completas,nuevas,oi in lotes:
+                    o+=oi
+                    for u,exponentes,_ in completas:
+                        relaciones[u]=(exponentes,1)
+                    # Dos parciales con el mismo primo grande forman una relación completa
+                    for u,exponentes,L in nuevas:
+                        if L not in parciales:
+                            parciales[L]=(u,exponentes)
+                        elif parciales[L][0]!=u:
+                            u2,e2=parciales[L]
+                            suma=dict(exponentes)
+                            for j,e in e2.items():
+                                suma[j]=suma.get(j,0)+e
+                            relaciones[u*u2]=(suma,L)
+                if checkpoint is not None and time.monotonic()-guardado>=intervalo:
+                    _guardar_relaciones(checkpoint,(n,k,F,M),relaciones,parciales,o)
+                    guardado=time.monotonic()
+            if checkpoint is not None:
+                _guardar_relaciones(checkpoint,(n,k,F,M),relaciones,parciales,o)
+            # Álgebra lineal y raíz cuadrada
+            us=list(relaciones)
+            filas=[sum(1<<j for j,e in relaciones[u][0].items() if e%2) for u in us]
+            for h in _siqs_dependencias(filas,len(base)+1):
+                X,Y=1,1
+                suma={}
+                for i in range(len(us)):
+                    if h>>i&1:
+                        exponentes,L=relaciones[us[i]]
+                        X=X*us[i]%n
+                        Y=Y*L%n
+                        for j,e in exponentes.items():
+                            suma[j]=suma.get(j,0)+e
+                for j,e in suma.items():
+                    if j>0:
+                        Y=Y*pow(base[j-1],e//2,n)%n
+                g=math.gcd(X-Y,n)
+                if 1<g<n:
+                    return sorted([g,n//g]),o
+            # Ninguna dependencia sirvió, juntar más relaciones
+            necesarias+=len(base)//10+10
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+#=====================================
+# Factorización automática por etapas
+#=====================================
+
+@instrumentation.instrumentado
+def factorizar(n,tiempo_rho=1.0,workers=None,tiempo_ecm=5.0):
+    """
+    factorizar(n,tiempo_rho=1.0,workers=None,tiempo_ecm=5.0): Factorización eligiendo el algoritmo por tamaño
+    Entrada: n es un entero positivo
+             tiempo_rho es el presupuesto en segundos de Pollard rho por cofactor
+             antes de escalar a ECM
+             workers es la cantidad de procesos para ECM y la criba cuadrática
+             tiempo_ecm es el presupuesto en segundos de ECM por cofactor antes
+             de escalar a la criba cuadrática
+    Salida:  un array con los factores primos de n (un cofactor que ningún método
+             separa se deja compuesto) y un diccionario con los segundos usados en
+             cada etapa
+    """
+
+    tiempos=dict.fromkeys(("division","primalidad","potencia","p-1","rho","ecm","siqs"),0.0)
+    def medir(etapa,ini):
+        tiempos[etapa]+=time.perf_counter()-ini
+        return time.perf_counter()
+    def rho(m,hasta):
+        # Cambiar de polinomio hasta separar a m o agotar el tiempo
+        c=1
+        while(True):
+            g,o=rho_brent(m,c,hasta=hasta)
+            instrumentation.contar("mulmod",o)
+            if g!=m:
+                return g
+            c+=1
+
+    # Etapa 1: quitar los factores primos pequeños
+    ini=time.perf_counter()
+    factores=[]
+    if math.gcd(n,PRODUCTO_PRIMOS_PEQUENOS)!=1:
+        for p in PRIMOS_PEQUENOS:
+            while(n%p==0):
+                n//=p
+                factores.append(p)
+    ini=medir("division",ini)
+    pendientes=[n] if n>1 else []
+    while(pendientes):
+        m=pendientes.pop()
+        # Etapa 2: el cofactor podría ser primo
+        primo=es_primo(m)
+        ini=medir("primalidad",ini)
+        if primo:
+            factores.append(m)
+            continue
+        potencia=potencia_perfecta(m)
+        ini=medir("potencia",ini)
+        if potencia is not None:
+            pendientes+=[potencia[0]]*potencia[1]
+            continue
+        # Etapa 3: métodos cada vez más pesados según el tamaño del cofactor
+        g=1
+        if m.bit_length()>50:
+            g,o=p_menos_1(m,B1=2000,B2=200000)
+            instrumentation.contar("mulmod",o)
+            ini=medir("p-1",ini)
+        if g in (1,m):
+            g=rho(m,ini+tiempo_rho)
+            ini=medir("rho",ini)
+        if g==1 and tiempo_ecm:
+            # ECM depende del tamaño del factor más pequeño, no del de m
+            g,o=ecm(m,workers=workers,hasta=ini+tiempo_ecm)
+            instrumentation.contar("mulmod",o)
+            ini=medir("ecm",ini)
+        if g==1:
+            try:
+                g=criba_cuadratica(m,workers=workers)[0][0]
+                ini=medir("siqs",ini)
+            except ImportError:
+                # Sin NumPy sigue ECM sin límite de tiempo, que escala con el factor más pequeño
+                g,o=ecm(m,workers=workers)
+                instrumentation.contar("mulmod",o)
+                ini=medir("ecm",ini)
+        if g==1:
+            # Ningún método lo separó: se deja compuesto
+            factores.append(m)
+            continue
+        pendientes+=[g,m//g]
+    factores.sort()
+    return factores,tiempos
+
+#============================================
+# Versiones sin el contador en el resultado
+#============================================
+
+# Regresan sólo el resultado; con instrumentation.activar() las operaciones
+# quedan en el registro de cada algoritmo
+prueba_tentativa_limpio=instrumentation.limpio(prueba_tentativa)
+prueba_tentativa2_limpio=instrumentation.limpio(prueba_tentativa2)
+division_tentativa_limpio=instrumentation.limpio(division_tentativa)
+division_tentativa2_limpio=instrumentation.limpio(division_tentativa2)
+division_tentativa3_limpio=instrumentation.limpio(division_tentativa3)
+division_tentativa_criba_limpio=instrumentation.limpio(division_tentativa_criba)
+pollard_rho_limpio=instrumentation.limpio(pollard_rho)
+pollard_p_menos_1_limpio=instrumentation.limpio(pollard_p_menos_1)
+lenstra_ecm_limpio=instrumentation.limpio(lenstra_ecm)
+criba_cuadratica_limpio=instrumentation.limpio(criba_cuadratica)
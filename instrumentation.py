@@ -0,0 +1,166 @@
+"""
+instrumentation.py - Conteo de operaciones y medición de tiempos
+---
+Autor: Erik Alberto Ríos Mena
+
+Registra, por cada algoritmo instrumentado, la cantidad de llamadas, el
+tiempo de reloj y los contadores de multiplicaciones modulares (mulmod),
+divisiones (div) y exponenciaciones (pow). Está desactivado por omisión:
+en ese modo cada llamada instrumentada sólo revisa una bandera.
+
+Uso:
+    instrumentation.activar()
+    factoring.factorizar(n)
+    instrumentation.exportar_json("perfil.json")
+"""
+
+import csv
+import json
+import time
+import functools
+from contextlib import contextmanager
+
+# Tomado de timeit.py
+units={"nanosegundos":1e-9,"microsegundos":1e-6,"milisegundos":1e-3,"segundos":1.0,"minutos":60.0}
+precision=3
+
+CONTADORES=("mulmod","div","pow")
+
+_activo=False
+_detalle=False
+# Registros abiertos: los contadores se suman al más interno y al cerrarse pasan al que lo contiene
+_pila=[]
+# Totales por nombre de algoritmo y, con detalle, un registro por llamada
+resumen={}
+llamadas=[]
+
+def format_time(dt):
+    """
+    format_time(dt): Representación legible de una duración
+    Entrada: dt es una duración en segundos
+    Salida:  una cadena con la duración en la unidad más adecuada
+    """
+    scales=sorted(((scale,unit) for unit,scale in units.items()),reverse=True)
+    for scale,unit in scales:
+        if dt>=scale:
+            break
+    return "%.*g %s" % (precision,dt/scale,unit)
+
+def activar(detalle=False):
+    """
+    activar(detalle=False): Enciende el registro
+    Entrada: detalle indica si guardar además un registro por cada llamada
+    """
+    global _activo,_detalle
+    _activo,_detalle=True,detalle
+
+def desactivar():
+    """
+    desactivar(): Apaga el registro (modo sin costo para producción)
+    """
+    global _activo
+    _activo=False
+
+def limpiar():
+    """
+    limpiar(): Borra los registros acumulados
+    """
+    resumen.clear()
+    llamadas.clear()
+
+def contar(tipo,k=1):
+    """
+    contar(tipo,k=1): Suma k operaciones de un tipo al algoritmo en curso
+    Entrada: tipo es "mulmod", "div", "pow" u otro nombre de contador
+             k es la cantidad de operaciones
+    """
+    if _activo and _pila:
+        registro=_pila[-1]
+        registro[tipo]=registro.get(tipo,0)+k
+
+@contextmanager
+def medir(nombre):
+    """
+    medir(nombre): Administrador de contexto que registra un bloque de código
+    Entrada: nombre es la etiqueta del registro
+    Salida:  el diccionario del registro, para añadirle contadores a mano
+    """
+    if not _activo:
+        yield {}
+        return
+    registro=dict.fromkeys(CONTADORES,0)
+    _pila.append(registro)
+    ini=time.perf_counter()
+    try:
+        yield registro
+    finally:
+        segundos=time.perf_counter()-ini
+        _pila.pop()
+        if _pila:
+            # Los conteos son inclusivos: el llamador también ve los de sus subrutinas
+            for tipo,k in registro.items():
+                _pila[-1][tipo]=_pila[-1].get(tipo,0)+k
+        total=resumen.setdefault(nombre,{"llamadas":0,"segundos":0.0})
+        total["llamadas"]+=1
+        total["segundos"]+=segundos
+        for tipo,k in registro.items():
+            total[tipo]=total.get(tipo,0)+k
+        if _detalle:
+            llamadas.append({"nombre":nombre,"segundos":segundos,**registro})
+
+def instrumentado(func=None,o=None):
+    """
+    instrumentado(func=None,o=None): Decorador que registra cada llamada de un algoritmo
+    Entrada: func es la función a instrumentar
+             o es el contador al que se suma el segundo elemento del resultado,
+             para las funciones que regresan (resultado, operaciones)
+    Salida:  la función envuelta
+    """
+    if func is None:
+        return functools.partial(instrumentado,o=o)
+    nombre=f"{func.__module__}.{func.__name__}"
+
+    @functools.wraps(func)
+    def envoltura(*args,**kwargs):
+        if not _activo:
+            return func(*args,**kwargs)
+        with medir(nombre) as registro:
+            resultado=func(*args,**kwargs)
+            if o is not None:
+                registro[o]=registro.get(o,0)+resultado[1]
+        return resultado
+    return envoltura
+
+def limpio(func):
+    """
+    limpio(func): Versión de un algoritmo sin el contador en su resultado
+    Entrada: func es una función que regresa (resultado, operaciones)
+    Salida:  una función que regresa sólo el resultado; las operaciones quedan
+             en el registro cuando está activo (factoring exporta así las
+             versiones *_limpio de sus algoritmos con contador)
+    """
+    @functools.wraps(func)
+    def envoltura(*args,**kwargs):
+        return func(*args,**kwargs)[0]
+    return envoltura
+
+def exportar_json(ruta):
+    """
+    exportar_json(ruta): Escribe los registros en JSON
+    Entrada: ruta es el archivo a escribir
+    """
+    with open(ruta,"w") as archivo:
+        json.dump({"resumen":resumen,"llamadas":llamadas},archivo,indent=1)
+
+def exportar_csv(ruta):
+    """
+    exportar_csv(ruta): Escribe el resumen por algoritmo en CSV
+    Entrada: ruta es el archivo a escribir
+    """
+    columnas=["llamadas","segundos",*CONTADORES]
+    columnas+=sorted({tipo for total in resumen.values() for tipo in total}-set(columnas))
+    with open(ruta,"w",newline="") as archivo:
+        escritor=csv.writer(archivo)
+        escritor.writerow(["nombre",*columnas])
+        for nombre,total in resumen.items():
+            escritor.writerow([nombre,*(total.get(c,0) for c in columnas)])
@@ -0,0 +1,166 @@
+"""
+jobs.py - Trabajos de factorización largos con puntos de control
+---
+Autor: Erik Alberto Ríos Mena
+
+Un trabajo de división por tentativa guarda periódicamente su estado (el
+divisor actual i, los factores encontrados y el contador de operaciones o)
+en un archivo, de modo que si el proceso muere se reanuda desde ahí. El
+intervalo de búsqueda se puede repartir en segmentos entre varios procesos.
+"""
+
+import os
+import json
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+class TrialDivisionJob:
+    """
+    TrialDivisionJob(n,path,lo=2,hi=None): División por tentativa reanudable
+    ---
+    Entrada: n es el entero a factorizar
+             path es el archivo del punto de control
+             lo es el primer divisor a probar
+             hi es la cota (exclusiva) de los divisores (default: None, i.e.
+             hasta que i^2 supere al cofactor, como division_tentativa3)
+
+    Estado:  m es el cofactor que falta por factorizar, i el siguiente divisor,
+             factores los divisores encontrados y o el contador de operaciones
+    """
+
+    def __init__(self,n,path,lo=2,hi=None):
+        self.n=self.m=n
+        self.path=path
+        self.i=lo
+        self.hi=hi
+        self.factores=[]
+        self.o=0
+        self.done=False
+
+    @classmethod
+    def load(cls,path):
+        """
+        load(path): Reanuda un trabajo desde su punto de control
+        ---
+        Entrada: path es el archivo escrito por save
+        Salida:  el TrialDivisionJob con el estado guardado
+        """
+        with open(path) as archivo:
+            estado=json.load(archivo)
+        job=cls(estado["n"],path,estado["i"],estado["hi"])
+        job.m,job.factores,job.o,job.done=estado["m"],estado["factores"],estado["o"],estado["done"]
+        return job
+
+    def save(self):
+        """
+        save(): Escribe el punto de control de forma atómica
+        """
+        estado={"n":self.n,"m":self.m,"i":self.i,"hi":self.hi,
+                "factores":self.factores,"o":self.o,"done":self.done}
+        tmp=self.path+".tmp"
+        with open(tmp,"w") as archivo:
+            json.dump(estado,archivo,separators=(",",":"))
+        # Reemplazar el archivo anterior sólo cuando el nuevo está completo
+        os.replace(tmp,self.path)
+
+    def run(self,interval=5.0,steps=1<<16):
+        """
+        run(interval=5.0,steps=1<<16): Corre el trabajo hasta terminar
+        ---
+        Entrada: interval es la cantidad de segundos entre puntos de control
+                 steps es la cantidad de divisiones entre revisiones del reloj
+
+        Salida:  un array con los factores encontrados y las operaciones hechas
+        """
+        m,i,o=self.m,self.i,self.o
+        hi=self.hi
+        ultimo=time.monotonic()
+        # El 2 se trata aparte para luego avanzar sólo sobre impares
+        if i<=2 and (hi is None or hi>2):
+            while(m%2==0 and m>1):
+                m//=2
+                self.factores.append(2)
+                o+=1
+            i=3
+        elif i%2==0:
+            i+=1
+        while(not self.done):
+            for _ in range(steps):
+                if i*i>m or (hi is not None and i>=hi):
+                    self.done=True
+                    break
+                if m%i==0:
+                    m//=i
+                    self.factores.append(i)
+                else:
+                    i+=2
+                o+=1
+            self.m,self.i,self.o=m,i,o
+            if self.done or time.monotonic()-ultimo>=interval:
+                self.save()
+                ultimo=time.monotonic()
+        factores=list(self.factores)
+        # Sin cota, el cofactor que sobra es primo (o unidad)
+        if hi is None and m!=1:
+            factores.append(m)
+        return factores,o
+
+def _run_segment(path,interval):
+    # Corre (o reanuda) un segmento en un proceso hijo y regresa sus factores
+    job=TrialDivisionJob.load(path)
+    factores,o=job.run(interval)
+    return factores,o
+
+def run_parallel(n,directory,workers=None,segments=None,interval=5.0):
+    """
+    run_parallel(n,directory,workers=None,segments=None,interval=5.0): División por tentativa repartida en procesos
+    ---
+    Entrada: n es el entero a factorizar
+             directory es donde se guardan los puntos de control de cada segmento;
+             si ya existen, los segmentos terminados se omiten y los demás se reanudan
+             workers es la cantidad de procesos (default: os.cpu_count())
+             segments es la cantidad de segmentos de [2,sqrt(n)] (default: la del
+             trabajo guardado en directory, o 4*workers)
+             interval es la cantidad de segundos entre puntos de control
+
+    Salida:  un array con los factores primos de n y las operaciones hechas
+    """
+    workers=workers or os.cpu_count() or 1
+    os.makedirs(directory,exist_ok=True)
+    # Los puntos de control sólo sirven para el mismo n y la misma partición
+    ruta=os.path.join(directory,"job.json")
+    if os.path.exists(ruta):
+        with open(ruta) as archivo:
+            clave=json.load(archivo)["clave"]
+        if clave[0]!=n or segments not in (None,clave[1]):
+            raise ValueError(f"{directory} tiene los puntos de control de otro trabajo")
+        segments=clave[1]
+    else:
+        if os.path.exists(os.path.join(directory,"segment0.json")):
+            raise ValueError(f"{directory} tiene puntos de control sin identificar")
+        segments=segments or 4*workers
+        with open(ruta,"w") as archivo:
+            json.dump({"clave":[n,segments]},archivo)
+    limite=math.isqrt(n)+1
+    paths=[]
+    for k in range(segments):
+        path=os.path.join(directory,f"segment{k}.json")
+        if not os.path.exists(path):
+            lo=2+k*(limite-2)//segments
+            hi=2+(k+1)*(limite-2)//segments
+            TrialDivisionJob(n,path,lo,hi).save()
+        paths.append(path)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        resultados=list(pool.map(_run_segment,paths,[interval]*len(paths)))
+    # Cada segmento divide sólo su propia copia de n, así que un divisor hallado
+    # puede ser compuesto de primos de segmentos anteriores: se filtran en orden
+    factores=[]
+    m=n
+    for i in sorted(i for segmento,_ in resultados for i in segmento):
+        while(m%i==0 and i>1):
+            m//=i
+            factores.append(i)
+    if m!=1:
+        factores.append(m)
+    return factores,sum(o for _,o in resultados)
@@ -0,0 +1,137 @@
+"""
+keypool.py - Reserva de claves RSA pregeneradas
+---
+Autor: Erik Alberto Ríos Mena
+
+Mantiene una cantidad configurable de claves listas por tamaño, rellenadas
+en segundo plano por un pool de procesos, para sacar la generación de
+claves del camino crítico de latencia.
+"""
+
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import rsa
+
+def _generate(bits):
+    # Genera una clave en un proceso hijo
+    return rsa.generate_private_key(bits=bits)
+
+class KeyPool:
+    """
+    KeyPool(sizes=(512,),target=4,workers=None): Reserva de claves privadas pregeneradas
+    ---
+    Entrada: sizes son los tamaños en bits de cada primo (como en rsa.generate_keys)
+             target es la cantidad de claves listas a mantener por tamaño
+             workers es la cantidad de procesos que rellenan la reserva
+
+    Contadores: hits y misses por cada llamada a take, y refill_times con la
+    latencia de cada clave generada en segundo plano, desde que se encola
+    hasta que queda lista (incluye la espera por un proceso libre).
+    """
+
+    def __init__(self,sizes=(512,),target=4,workers=None):
+        self.target=target
+        self.hits=0
+        self.misses=0
+        self.refill_times=[]
+        self._keys={bits:deque() for bits in sizes}
+        # Generaciones encoladas que aún no terminan, por tamaño
+        self._pending={bits:set() for bits in sizes}
+        self._lock=threading.Lock()
+        self._pool=ProcessPoolExecutor(max_workers=workers)
+        self._closed=False
+        for bits in sizes:
+            self._refill(bits)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc):
+        self.close()
+
+    def _refill(self,bits):
+        # Encola las generaciones necesarias para volver a tener target claves
+        futuros=[]
+        with self._lock:
+            if self._closed:
+                return
+            while(len(self._keys[bits])+len(self._pending[bits])<self.target):
+                f=self._pool.submit(_generate,bits)
+                self._pending[bits].add(f)
+                futuros.append((f,time.perf_counter()))
+        # Fuera del candado: si el futuro ya terminó, _store corre aquí mismo y lo toma
+        for f,ini in futuros:
+            f.add_done_callback(lambda f,bits=bits,ini=ini: self._store(bits,f,ini))
+
+    def _store(self,bits,future,ini):
+        # Guarda una clave recién generada (corre en el hilo del pool)
+        with self._lock:
+            self._pending[bits].discard(future)
+            if future.cancelled() or future.exception() is not None:
+                return
+            self._keys[bits].append(future.result())
+            self.refill_times.append(time.perf_counter()-ini)
+
+    def take(self,bits=512):
+        """
+        take(bits=512): Toma una clave de la reserva sin bloquear
+        ---
+        Entrada: bits es el tamaño de cada primo de la clave
+        Salida:  un rsa.PrivateKey, o None si no hay claves listas
+        """
+        if bits not in self._keys:
+            raise KeyError(f"la reserva no mantiene claves de {bits} bits")
+        with self._lock:
+            key=self._keys[bits].popleft() if self._keys[bits] else None
+            if key is None:
+                self.misses+=1
+            else:
+                self.hits+=1
+        self._refill(bits)
+        return key
+
+    async def take_async(self,bits=512):
+        """
+        take_async(bits=512): Toma una clave de la reserva, esperando sin bloquear el ciclo de eventos
+        ---
+        Entrada: bits es el tamaño de cada primo de la clave
+        Salida:  un rsa.PrivateKey; si la reserva está vacía se espera al relleno ya
+                 encolado por take
+        """
+        key=self.take(bits)
+        while(key is None):
+            with self._lock:
+                pendientes=list(self._pending[bits])
+            if not pendientes:
+                # Reserva cerrada o sin relleno en curso: generar una clave aparte
+                return await asyncio.wrap_future(self._pool.submit(_generate,bits))
+            await asyncio.wait([asyncio.wrap_future(f) for f in pendientes],return_when=asyncio.FIRST_COMPLETED)
+            # Otra corrutina o hilo pudo tomar la clave primero; tomarla sin contar otro fallo
+            with self._lock:
+                key=self._keys[bits].popleft() if self._keys[bits] else None
+        self._refill(bits)
+        return key
+
+    def stats(self):
+        """
+        stats(): Contadores de la reserva
+        ---
+        Salida:  un diccionario con aciertos, fallos, claves listas por tamaño y
+                 latencia media de relleno en segundos
+        """
+        with self._lock:
+            return {"hits":self.hits,
+                    "misses":self.misses,
+                    "ready":{bits:len(keys) for bits,keys in self._keys.items()},
+                    "refill_mean":sum(self.refill_times)/len(self.refill_times) if self.refill_times else None}
+
+    def close(self):
+        """
+        close(): Detiene el rellenado y libera los procesos
+        """
+        with self._lock:
+            self._closed=True
+        self._pool.shutdown(wait=True,cancel_futures=True)
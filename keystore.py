@@ -0,0 +1,216 @@
+"""
+keystore.py - Formato binario de claves y textos cifrados, y almacenes de claves
+---
+Autor: Erik Alberto Ríos Mena
+
+Cada entero se guarda en big-endian con ancho fijo: los del tamaño del
+módulo (n, e, d, textos cifrados) en k bytes y los del tamaño de los primos
+(p, q, dP, dQ, qInv y los de los primos adicionales) en h bytes. Un registro
+de clave es una cabecera de 10 bytes seguida de sus enteros, así que se lee
+con slicing sin parsear texto.
+
+Un almacén es un archivo con muchos registros y un índice ordenado por
+identificador de clave; se mapea en memoria y cada búsqueda es una
+bisección sobre el índice, de modo que abrirlo no lee las claves.
+"""
+
+import os
+import mmap
+import bisect
+import struct
+import hashlib
+from array import array
+import rsa
+
+# Cabecera de un registro de clave: firma, versión, tipo, k y h; el tipo de una
+# clave privada con u primos adicionales es _PRIVADA+u
+_CLAVE=struct.Struct("<4sBBHH")
+_FIRMA_CLAVE=b"RSAK"
+_PUBLICA,_PRIVADA=0,1
+# Cabecera de un bloque de textos cifrados: firma, versión, k y cantidad
+_BLOQUE=struct.Struct("<4sBxHQ")
+_FIRMA_BLOQUE=b"RSAC"
+# Cabecera de un almacén: firma y cantidad de claves; le siguen los identificadores
+# ordenados y los desplazamientos de sus registros, como enteros de 64 bits
+_ALMACEN=struct.Struct("<8sQ")
+_FIRMA_ALMACEN=b"KEYSTOR\x01"
+_VERSION=1
+
+def _width(x):
+    # Bytes necesarios para un entero no negativo (al menos uno)
+    return max(1,(x.bit_length()+7)//8)
+
+def key_id(n):
+    """
+    key_id(n): Identificador de una clave
+    ---
+    Entrada: n es el módulo RSA
+    Salida:  un entero de 64 bits tomado del SHA-256 del módulo
+    """
+    return int.from_bytes(hashlib.sha256(n.to_bytes(_width(n),'big')).digest()[:8],'big')
+
+def dump_key(key):
+    """
+    dump_key(key): Serializa una clave pública o privada
+    ---
+    Entrada: key es un rsa.PrivateKey o una tupla (e,n) con la clave pública
+    Salida:  los bytes del registro
+    """
+    if isinstance(key,rsa.PrivateKey):
+        k=_width(key.n)
+        h=_width(max(key.primes))
+        partes=[_CLAVE.pack(_FIRMA_CLAVE,_VERSION,_PRIVADA+len(key.others),k,h)]
+        partes+=[x.to_bytes(k,'big') for x in (key.n,key.e,key.d)]
+        partes+=[x.to_bytes(h,'big') for x in (key.p,key.q,key.dp,key.dq,key.qinv)]
+        # Los primos adicionales van como tripletas (r_i, d_i, t_i) de h bytes
+        partes+=[x.to_bytes(h,'big') for tripleta in key.others for x in tripleta]
+        return b"".join(partes)
+    e,n=key
+    k=_width(n)
+    if e>=1<<8*k:
+        raise ValueError("el exponente no cabe en el ancho del módulo")
+    return _CLAVE.pack(_FIRMA_CLAVE,_VERSION,_PUBLICA,k,0)+n.to_bytes(k,'big')+e.to_bytes(k,'big')
+
+def _key_size(kind,k,h):
+    # Tamaño total de un registro a partir de su cabecera
+    return _CLAVE.size+(2*k if kind==_PUBLICA else 3*k+5*h+3*h*(kind-_PRIVADA))
+
+def load_key(data,offset=0):
+    """
+    load_key(data,offset=0): Lee un registro de clave
+    ---
+    Entrada: data es un objeto de bytes (bytes, memoryview, mmap)
+             offset es la posición del registro dentro de data
+    Salida:  un rsa.PrivateKey o una tupla (e,n)
+    """
+    firma,version,kind,k,h=_CLAVE.unpack_from(data,offset)
+    if firma!=_FIRMA_CLAVE or version!=_VERSION:
+        raise ValueError("no es un registro de clave de esta versión")
+    view=memoryview(data)[offset+_CLAVE.size:offset+_key_size(kind,k,h)]
+    if kind==_PUBLICA:
+        n,e=(int.from_bytes(view[i:i+k],'big') for i in (0,k))
+        return e,n
+    n,e,d=(int.from_bytes(view[i:i+k],'big') for i in (0,k,2*k))
+    p,q,dp,dq,qinv,*otros=(int.from_bytes(view[i:i+h],'big') for i in range(3*k,len(view),h))
+    others=[otros[i:i+3] for i in range(0,len(otros),3)]
+    return rsa.PrivateKey.from_crt(p,q,e,d,dp,dq,qinv,others)
+
+def dump_cyphers(cyphers,n):
+    """
+    dump_cyphers(cyphers,n): Serializa textos cifrados con un mismo módulo
+    ---
+    Entrada: cyphers es un iterable de textos cifrados como enteros
+             n es el módulo RSA con que se encriptaron
+    Salida:  los bytes del bloque (cabecera y un entero de k bytes por texto)
+    """
+    k=_width(n)
+    cuerpo=b"".join(c.to_bytes(k,'big') for c in cyphers)
+    return _BLOQUE.pack(_FIRMA_BLOQUE,_VERSION,k,len(cuerpo)//k)+cuerpo
+
+def load_cyphers(data):
+    """
+    load_cyphers(data): Lee un bloque de textos cifrados
+    ---
+    Entrada: data es un objeto de bytes escrito por dump_cyphers
+    Salida:  una lista con los textos cifrados como enteros
+    """
+    firma,version,k,count=_BLOQUE.unpack_from(data)
+    if firma!=_FIRMA_BLOQUE or version!=_VERSION:
+        raise ValueError("no es un bloque de textos cifrados de esta versión")
+    view=memoryview(data)[_BLOQUE.size:_BLOQUE.size+k*count]
+    return [int.from_bytes(view[i:i+k],'big') for i in range(0,k*count,k)]
+
+def write_keystore(path,keys):
+    """
+    write_keystore(path,keys): Escribe un almacén de claves
+    ---
+    Entrada: path es el archivo a escribir
+             keys es un diccionario {identificador: clave}, o un iterable de claves
+             (rsa.PrivateKey o (e,n)) que se identifican con key_id
+    Salida:  la cantidad de claves escritas
+    """
+    if not isinstance(keys,dict):
+        keys={key_id(key.n if isinstance(key,rsa.PrivateKey) else key[1]):key for key in keys}
+    ids=array('Q',sorted(keys))
+    offsets=array('Q')
+    # Los registros empiezan después de la cabecera y del índice
+    offset=_ALMACEN.size+16*len(ids)
+    registros=[]
+    for i in ids:
+        registros.append(dump_key(keys[i]))
+        offsets.append(offset)
+        offset+=len(registros[-1])
+    tmp=path+".tmp"
+    with open(tmp,"wb") as archivo:
+        archivo.write(_ALMACEN.pack(_FIRMA_ALMACEN,len(ids)))
+        archivo.write(ids)
+        archivo.write(offsets)
+        for registro in registros:
+            archivo.write(registro)
+    os.replace(tmp,path)
+    return len(ids)
+
+class Keystore:
+    """
+    Keystore(path): Almacén de claves mapeado en memoria
+    ---
+    Entrada: path es un archivo escrito por write_keystore
+
+    Se usa como un diccionario de sólo lectura {identificador: clave}; cada
+    clave se lee del mapeo al pedirla, así que abrir el almacén sólo lee la
+    cabecera sin importar cuántas claves tenga.
+    """
+
+    def __init__(self,path):
+        with open(path,"rb") as archivo:
+            self._datos=mmap.mmap(archivo.fileno(),0,access=mmap.ACCESS_READ)
+        firma,count=_ALMACEN.unpack_from(self._datos)
+        if firma!=_FIRMA_ALMACEN:
+            self._datos.close()
+            raise ValueError(f"{path} no es un almacén de claves")
+        indice=memoryview(self._datos)[_ALMACEN.size:_ALMACEN.size+16*count].cast('Q')
+        self._ids,self._offsets=indice[:count],indice[count:]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc):
+        self.close()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def _find(self,key_id):
+        # Posición del identificador en el índice, o -1 si no está
+        i=bisect.bisect_left(self._ids,key_id)
+        return i if i<len(self._ids) and self._ids[i]==key_id else -1
+
+    def __contains__(self,key_id):
+        return self._find(key_id)>=0
+
+    def __getitem__(self,key_id):
+        i=self._find(key_id)
+        if i<0:
+            raise KeyError(key_id)
+        return load_key(self._datos,self._offsets[i])
+
+    def get(self,key_id,default=None):
+        """
+        get(key_id,default=None): Busca una clave
+        ---
+        Entrada: key_id es el identificador de la clave
+        Salida:  la clave, o default si no está en el almacén
+        """
+        i=self._find(key_id)
+        return default if i<0 else load_key(self._datos,self._offsets[i])
+
+    def close(self):
+        """
+        close(): Libera el mapeo del archivo
+        """
+        self._ids.release()
+        self._offsets.release()
+        self._datos.close()
@@ -8,33 +8,130 @@ Incluye una implementación del cifrado de un mensaje w arbitrario
 de primalidad probabilísticas (Miller-Rabin) en tiempo polinómico
 """
 
+import math
 import random
 import factoring
-import numpy as np
+import instrumentation
+from itertools import repeat
 
-def generate_prime(digits,n=1,base=10,trials=10):
+def _sieve_window(start,window):
     """
-    generate_prime(digits,n=1,base=10,trials=10): Generación de números primos
+    _sieve_window(start,window): Criba incremental de candidatos impares
+    ---
+    Entrada: start es un entero impar
+             window es la cantidad de impares start, start+2, ..., a cribar
+
+    Salida:  un bytearray con 1 en los desplazamientos i tales que start+2i no
+             tiene factores primos pequeños
+    """
+    flags=bytearray([1])*window
+    for p in factoring.PRIMOS_PEQUENOS[1:]:
+        # Primer i con start+2i=0 mod p, i.e. i=-start*2^{-1} mod p
+        i=((p-start%p)*((p+1)//2))%p
+        if start+2*i==p:
+            # p mismo es primo, no descartarlo
+            i+=p
+        flags[i::p]=bytes(len(range(i,window,p)))
+    return flags
+
+# Bandera con la que generate_prime detiene las búsquedas de sus procesos hijos
+_alto=None
+# Pool compartido por las llamadas a generate_prime: (workers, pool, bandera)
+_pool_primos=None
+
+def _init_search(alto):
+    # Inicializador de los procesos del pool: guarda la bandera compartida
+    global _alto
+    _alto=alto
+
+def _prime_pool(workers):
+    # Pool de procesos de generate_prime, creado una vez por cantidad de procesos
+    global _pool_primos
+    if _pool_primos is None or _pool_primos[0]!=workers:
+        if _pool_primos is not None:
+            _pool_primos[1].shutdown()
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        alto=multiprocessing.Event()
+        pool=ProcessPoolExecutor(max_workers=workers,initializer=_init_search,initargs=(alto,))
+        _pool_primos=(workers,pool,alto)
+    return _pool_primos[1],_pool_primos[2]
+
+def _search_prime(lo,hi,trials,window=4096,reseed=False):
+    """
+    _search_prime(lo,hi,trials,window=4096,reseed=False): Búsqueda incremental de un primo en [lo,hi)
+    ---
+    Entrada: lo y hi delimitan el intervalo de búsqueda
+             trials es la cantidad de pruebas Miller-Rabin (None: factoring.es_primo)
+             window es la cantidad de impares cribados a la vez
+             reseed indica si reiniciar la semilla (necesario en procesos hijos)
+
+    Salida:  un primo probable en [lo,hi), o None si generate_prime detuvo la búsqueda
+    """
+    if reseed:
+        random.seed()
+    while(True):
+        # Iniciar en un impar aleatorio y avanzar por ventanas cribadas
+        cand=random.randrange(lo,hi)|1
+        while(cand<hi):
+            flags=_sieve_window(cand,window)
+            for i in range(window):
+                if flags[i]:
+                    c=cand+2*i
+                    if c>=hi:
+                        break
+                    # Revisar la bandera antes de cada prueba, que es lo que cuesta con primos grandes
+                    if _alto is not None and _alto.is_set():
+                        return None
+                    # Sólo los sobrevivientes de la criba llegan a la prueba de primalidad
+                    if trials is None:
+                        if factoring.es_primo(c,criba=False):
+                            return c
+                    elif factoring.miller_rabin(c,trials)==True:
+                        return c
+            cand+=2*window
+
+@instrumentation.instrumentado
+def generate_prime(digits,n=1,base=10,trials=None,workers=None):
+    """
+    generate_prime(digits,n=1,base=10,trials=None,workers=None): Generación de números primos
     ---
     Entrada: digits es la cantidad de dígitos en los números a generar
              n es la cantidad de primos a generar (default:1)
              base es la representación posicional del número (default: decimal)
-             trials es la cantidad de pruebas Miller-Rabin (default: 10)
+             trials es la cantidad de pruebas Miller-Rabin (default: None, i.e. prueba
+                    determinista o Baillie-PSW con factoring.es_primo)
+             workers es la cantidad de procesos que buscan en paralelo (default: None, i.e. en serie)
     
     Salida:  un int (n=1) o array con los primos generados
     """
 
+    lo,hi=base**(digits-1)+1,base**digits
+    if (lo|1)>=hi:
+        raise ValueError("no hay suficientes enteros con esa cantidad de dígitos")
     p=[]
-    for _ in range(n):
-        while(True):
-            # Generar un entero y probarlo con Miller-Rabin
-            random.seed()
-            cand=random.randrange(base**(digits-1)+1,base**digits,2)
-            if factoring.miller_rabin(cand,trials)==True:
-                # Es primo, guardarlo
-                p.append(cand)
-                break
-    return cand if n==1 else p
+    if workers is None or workers<=1:
+        for _ in range(n):
+            p.append(_search_prime(lo,hi,trials))
+    else:
+        # Cada proceso busca desde su propio punto aleatorio; se toma el primero que termine
+        from concurrent.futures import wait,FIRST_COMPLETED
+        pool,alto=_prime_pool(workers)
+        pending=set()
+        try:
+            pending={pool.submit(_search_prime,lo,hi,trials,reseed=True) for _ in range(workers)}
+            while(len(p)<n):
+                done,pending=wait(pending,return_when=FIRST_COMPLETED)
+                for f in done:
+                    if len(p)<n:
+                        p.append(f.result())
+                        pending.add(pool.submit(_search_prime,lo,hi,trials,reseed=True))
+        finally:
+            # Detener las búsquedas que siguen corriendo antes de que otra llamada use el pool
+            alto.set()
+            wait(pending)
+            alto.clear()
+    return p[0] if n==1 else p
 
 def extended_euclidean_algorithm(a,b):
     """
@@ -48,37 +145,142 @@ def extended_euclidean_algorithm(a,b):
 
     r,r_prime=b,a
     t,t_prime=0,1
-    # Este es el procedimiento de la división con residuo
+    # Este es el procedimiento de la división con residuo, con cocientes enteros
+    # exactos (una división en flotantes pierde precisión para b>2^53)
     while(r_prime!=0):
-        q=int(np.fix(r/r_prime))
+        q=r//r_prime
         r,r_prime=r_prime,r-q*r_prime
         t,t_prime=t_prime,t-q*t_prime
     return t+b if t<0 else t
 
-def generate_keys(p=[None,None],bits=512,base=2,e=None,e_bits=5,e_base=2,trials=10):
+def lehmer_inverse(a,m,bits=62):
+    """
+    lehmer_inverse(a,m,bits=62): Inverso modular con el algoritmo de Lehmer
+    ---
+    Entrada: a es el entero a invertir
+             m es el módulo
+             bits es la precisión de los dígitos principales simulados
+    
+    Salida:  el entero t en [0,m) que cumple a*t=1 mod m
+    """
+
+    r0,r1=m,a%m
+    t0,t1=0,1
+    while(r1.bit_length()>bits):
+        # Simular varios pasos de Euclides con los bits más significativos
+        shift=r0.bit_length()-bits
+        x,y=r0>>shift,r1>>shift
+        A,B,C,D=1,0,0,1
+        while(y+C!=0 and y+D!=0):
+            q=(x+A)//(y+C)
+            if q!=(x+B)//(y+D):
+                break
+            A,C=C,A-q*C
+            B,D=D,B-q*D
+            x,y=y,x-q*y
+        if B==0:
+            # No se pudo simular ni un paso, hacer uno completo
+            q=r0//r1
+            r0,r1=r1,r0-q*r1
+            t0,t1=t1,t0-q*t1
+        else:
+            r0,r1=A*r0+B*r1,C*r0+D*r1
+            t0,t1=A*t0+B*t1,C*t0+D*t1
+    # Terminar con el algoritmo de Euclides sobre operandos chicos
+    while(r1!=0):
+        q=r0//r1
+        r0,r1=r1,r0-q*r1
+        t0,t1=t1,t0-q*t1
+    if r0!=1:
+        raise ValueError(f"{a} no es invertible módulo {m}")
+    return t0%m
+
+@instrumentation.instrumentado
+def modular_inverse(a,m,method="pow"):
     """
-    generate_keys(p=[None,None],bits=512,base=2,e=None,e_bits=7,e_base=2,trials=10): Generación de clave pública y privada RSA
+    modular_inverse(a,m,method="pow"): Inverso modular
     ---
-    Entrada: p es un array de dos números primos (default: [None, None], i.e. generar ambos primos)
+    Entrada: a es el entero a invertir
+             m es el módulo
+             method es "pow" (pow(a,-1,m) de Python), "lehmer" (lehmer_inverse)
+             o "euclid" (extended_euclidean_algorithm)
+    
+    Salida:  el entero t en [0,m) que cumple a*t=1 mod m
+    """
+    if method=="pow":
+        return pow(a,-1,m)
+    if method=="lehmer":
+        return lehmer_inverse(a,m)
+    if method=="euclid":
+        if math.gcd(a,m)!=1:
+            raise ValueError(f"{a} no es invertible módulo {m}")
+        return extended_euclidean_algorithm(a%m,m)%m
+    raise ValueError(f"método de inversión desconocido: {method}")
+
+def batch_inverse(values,m):
+    """
+    batch_inverse(values,m): Inversos modulares de muchos enteros con el truco de Montgomery
+    ---
+    Entrada: values es una lista de enteros invertibles módulo m
+             m es el módulo
+    
+    Salida:  una lista con los inversos, calculados con un solo inverso modular
+             y 3(k-1) multiplicaciones
+    """
+    if not values:
+        return []
+    # Productos prefijos v_0 v_1 ... v_i mod m
+    prefix=[values[0]%m]
+    for v in values[1:]:
+        prefix.append(prefix[-1]*v%m)
+    inv=pow(prefix[-1],-1,m)
+    result=[0]*len(values)
+    for i in range(len(values)-1,0,-1):
+        # (v_0...v_i)^{-1} * (v_0...v_{i-1}) = v_i^{-1}
+        result[i]=inv*prefix[i-1]%m
+        inv=inv*values[i]%m
+    result[0]=inv
+    return result
+
+@instrumentation.instrumentado
+def generate_keys(p=[None,None],bits=512,base=2,e=None,e_bits=5,e_base=2,trials=None,workers=None):
+    """
+    generate_keys(p=[None,None],bits=512,base=2,e=None,e_bits=7,e_base=2,trials=None,workers=None): Generación de clave pública y privada RSA
+    ---
+    Entrada: p es un array de dos números primos (default: [None, None], i.e. generar ambos primos);
+               con tres o cuatro entradas se genera una clave multi-primo (RFC 8017),
+               e.g. p=[None]*3 y bits=1024 para un módulo de 3072 bits
              bits es la cantidad de bits o dígitos en cada p (default: 512 bits)
              base es la representación posicional de cada p (default: 2, i.e. binaria)
              e es el exponente de encriptación (default: None, i.e. generarlo)
              e_bits es la cantidad de bits o dígitos en e (default: 7 bits)
              e_base es la representación posicional de e (default: 2, i.e. binaria)
-             trials es la cantidad de pruebas Miller-Rabin (default: 10)
+             trials es la cantidad de pruebas Miller-Rabin (default: None, i.e. prueba
+                    determinista o Baillie-PSW con factoring.es_primo)
+             workers es la cantidad de procesos que buscan los primos en paralelo
 
-    Salida:  p[0] y p[1] son los factores del módulo RSA
-             n:=p[0]*p[1] es el módulo RSA
+    Salida:  p[0], p[1], ... son los factores del módulo RSA
+             n:=p[0]*p[1]*... es el módulo RSA
              e es el exponente de encriptación
              d es el exponente de decriptación
     """
 
-    # Generar a p de ser necesario
+    # Generar los primos que falten, todos distintos; los dados no se tocan
     random.seed()
-    if p[0] is None or p[1] is None:
-        p=generate_prime(bits,n=2,base=base,trials=trials)
-    # Calcular la phi de Euler de p y q
-    phi=(p[0]-1)*(p[1]-1)
+    p=list(p)
+    dados=[x for x in p if x is not None]
+    if len(set(dados))<len(dados):
+        raise ValueError("los primos dados deben ser distintos")
+    generados=[i for i in range(len(p)) if p[i] is None]
+    faltan=generados
+    while(faltan):
+        nuevos=generate_prime(bits,n=len(faltan),base=base,trials=trials,workers=workers)
+        for i,primo in zip(faltan,nuevos if len(faltan)>1 else [nuevos]):
+            p[i]=primo
+        # Volver a generar los que repiten un primo dado o uno generado antes
+        faltan=[i for i in generados if p[i] in dados or p.index(p[i])!=i]
+    # Calcular la phi de Euler de n
+    phi=math.prod(x-1 for x in p)
     # Generar al exponente de encriptación de ser necesario
     if e is None:
         e=phi
@@ -86,9 +288,107 @@ def generate_keys(p=[None,None],bits=512,base=2,e=None,e_bits=5,e_base=2,trials=
         while(phi%e==0):
             e=generate_prime(e_bits,base=e_base,trials=trials)
     # Calcular el exponente de decriptación
-    d=extended_euclidean_algorithm(e,phi)
-    return p[0],p[1],p[0]*p[1],e,d
+    d=modular_inverse(e,phi)
+    return (*p,math.prod(p),e,d)
+
+class PrivateKey:
+    """
+    PrivateKey(p,q,e,d,others=()): Clave privada RSA con parámetros del teorema chino del residuo
+    ---
+    Entrada: p y q son los factores primos del módulo RSA
+             e es el exponente de encriptación
+             d es el exponente de decriptación
+             others son los primos adicionales r_3, r_4, ... de una clave multi-primo
 
+    Precalcula una sola vez dP=d mod (p-1), dQ=d mod (q-1) y qInv=q^{-1} mod p,
+    de modo que cada decriptación hace dos exponenciaciones con módulos de la
+    mitad del tamaño de n y las recombina con el algoritmo de Garner. Para cada
+    primo adicional r_i guarda, como en RFC 8017, d_i=d mod (r_i-1) y
+    t_i=(p*q*r_3*...*r_{i-1})^{-1} mod r_i, con los que se sigue recombinando.
+    """
+
+    __slots__=("p","q","n","e","d","dp","dq","qinv","others")
+
+    def __init__(self,p,q,e,d,others=()):
+        self.p,self.q=p,q
+        self.e,self.d=e,d
+        self.dp=d%(p-1)
+        self.dq=d%(q-1)
+        self.qinv=pow(q,-1,p)
+        # Tripletas (r_i, d_i, t_i) de los primos adicionales
+        self.others=[]
+        R=p*q
+        for r in others:
+            self.others.append((r,d%(r-1),pow(R,-1,r)))
+            R*=r
+        self.n=R
+
+    @classmethod
+    def from_crt(cls,p,q,e,d,dp,dq,qinv,others=()):
+        """
+        from_crt(p,q,e,d,dp,dq,qinv,others=()): Reconstruye una clave con sus parámetros del TCR ya calculados
+        ---
+        Entrada: p, q, e y d como en PrivateKey
+                 dp, dq y qinv son d mod (p-1), d mod (q-1) y q^{-1} mod p
+                 others son las tripletas (r_i, d_i, t_i) de los primos adicionales
+        Salida:  el PrivateKey, sin volver a calcular los inversos modulares
+        """
+        key=cls.__new__(cls)
+        key.p,key.q=p,q
+        key.e,key.d=e,d
+        key.dp,key.dq,key.qinv=dp,dq,qinv
+        key.others=[tuple(t) for t in others]
+        key.n=math.prod((r for r,_,_ in key.others),start=p*q)
+        return key
+
+    @property
+    def primes(self):
+        # Todos los factores primos del módulo, en el orden de RFC 8017
+        return [self.p,self.q,*(r for r,_,_ in self.others)]
+
+    def __iter__(self):
+        # Permite desempacar la clave como la tupla de generate_keys
+        return iter((*self.primes,self.n,self.e,self.d))
+
+    def __repr__(self):
+        return f"PrivateKey(n={self.n}, e={self.e})"
+
+    def decrypt_int(self,cypher):
+        """
+        decrypt_int(cypher): Calcula w=c^d mod n mediante el TCR
+        ---
+        Entrada: cypher es el texto cifrado como entero
+        Salida:  el entero w
+        """
+        instrumentation.contar("pow",2+len(self.others))
+        m1=pow(cypher,self.dp,self.p)
+        m2=pow(cypher,self.dq,self.q)
+        # Recombinación de Garner: w=m2+q*(qInv*(m1-m2) mod p)
+        h=(self.qinv*(m1-m2))%self.p
+        w=m2+h*self.q
+        # Cada primo adicional se recombina con el producto R de los anteriores
+        R=self.p*self.q
+        for r,dr,t in self.others:
+            h=(pow(cypher,dr,r)-w)*t%r
+            w+=R*h
+            R*=r
+        return w
+
+@instrumentation.instrumentado
+def generate_private_key(p=[None,None],bits=512,base=2,e=None,e_bits=5,e_base=2,trials=None,workers=None):
+    """
+    generate_private_key(p=[None,None],bits=512,base=2,e=None,e_bits=5,e_base=2,trials=None,workers=None): Generación de clave privada RSA con TCR
+    ---
+    Entrada: los mismos parámetros que generate_keys
+
+    Salida:  un PrivateKey con los parámetros dP, dQ y qInv (y los de los primos
+             adicionales de una clave multi-primo) precalculados
+    """
+
+    *primos,_,e,d=generate_keys(p=p,bits=bits,base=base,e=e,e_bits=e_bits,e_base=e_base,trials=trials,workers=workers)
+    return PrivateKey(primos[0],primos[1],e,d,primos[2:])
+
+@instrumentation.instrumentado
 def raw_encrypt(plaintext,e,n,encoding="utf8"):
     """
     raw_encrypt(plaintext,e,n,encoding="utf8"): Encriptación RSA básica
@@ -104,8 +404,10 @@ def raw_encrypt(plaintext,e,n,encoding="utf8"):
     plaintext=plaintext.encode(encoding).hex()
     # - Convierte la representación hexadecimal a un entero decimal
     # - Calcula c=w^e mod n
+    instrumentation.contar("pow")
     return pow(int(plaintext,16),e,n)
 
+@instrumentation.instrumentado
 def raw_decrypt(cypher,d,n,encoding="utf8"):
     """
     raw_decrypt(plaintext,e,d,encoding="utf8"): Decriptación RSA básica
@@ -120,8 +422,173 @@ def raw_decrypt(cypher,d,n,encoding="utf8"):
     # - Convierte el texto cifrado en decimal a una representación hexadecimal
     # - Calcula w=c^d mod n
     # - Convierte de vuelta a una cadena
+    instrumentation.contar("pow")
     return bytes.fromhex(format(pow(cypher,d,n),'x')).decode(encoding)
 
+@instrumentation.instrumentado
+def crt_decrypt(cypher,key,encoding="utf8"):
+    """
+    crt_decrypt(cypher,key,encoding="utf8"): Decriptación RSA con el teorema chino del residuo
+    ---
+    Entrada: cypher es el texto cifrado en decimal
+             key es un PrivateKey
+             encoding es la codificiación de la cadena (default: UTF-8)
+
+    Salida:  una cadena con el mensaje decriptado.
+    """
+    # Mismo resultado que raw_decrypt, pero con exponentes y módulos de la mitad de tamaño
+    w=key.decrypt_int(cypher)
+    return w.to_bytes((w.bit_length()+7)//8,'big').decode(encoding)
+
+def _pow_many(ints,exp,n):
+    # Exponenciación de un lote de enteros; se define a nivel de módulo para que los procesos la importen
+    return [pow(m,exp,n) for m in ints]
+
+def _crt_many(ints,key):
+    # Decriptación con TCR de un lote de enteros
+    return [key.decrypt_int(c) for c in ints]
+
+def _map_batches(func,ints,arg,workers,chunksize):
+    # Aplica func a ints por lotes, en serie o repartidos en un pool de procesos
+    if workers is None or workers<=1 or len(ints)<=chunksize:
+        return func(ints,*arg)
+    # El pool (y multiprocessing) se importa sólo cuando de verdad se reparte el trabajo
+    from concurrent.futures import ProcessPoolExecutor
+    batches=[ints[i:i+chunksize] for i in range(0,len(ints),chunksize)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results=pool.map(func,batches,*(repeat(a) for a in arg))
+        return [x for batch in results for x in batch]
+
+def _split_buffer(buffer,size):
+    # Parte un buffer contiguo en registros de size bytes sin copiarlo
+    view=memoryview(buffer).cast('B')
+    if size<1 or len(view)%size!=0:
+        raise ValueError(f"el buffer de {len(view)} bytes no se divide en registros de {size} bytes")
+    return [view[i:i+size] for i in range(0,len(view),size)]
+
+@instrumentation.instrumentado
+def encrypt_many(messages,e,n,encoding="utf8",size=None,workers=None,chunksize=256):
+    """
+    encrypt_many(messages,e,n,encoding="utf8",size=None,workers=None,chunksize=256): Encriptación RSA por lotes
+    ---
+    Entrada: messages es un iterable de cadenas (o bytes), o un buffer contiguo
+             (bytes, bytearray, memoryview) de registros de tamaño fijo
+             e es el exponente de encriptación
+             n es el módulo RSA
+             encoding es la codificiación de las cadenas (default: UTF-8)
+             size es el tamaño en bytes de cada registro del buffer
+             (default: None, i.e. el máximo que cabe en n)
+             workers es la cantidad de procesos (default: None, i.e. en serie)
+             chunksize es la cantidad de mensajes por lote enviado a cada proceso
+
+    Salida:  una lista con la representación decimal de cada mensaje encriptado.
+    """
+    if isinstance(messages,(bytes,bytearray,memoryview)):
+        records=_split_buffer(messages,(n.bit_length()-1)//8 if size is None else size)
+    else:
+        records=[m.encode(encoding) if isinstance(m,str) else m for m in messages]
+    # int.from_bytes evita el viaje de ida y vuelta por cadenas hexadecimales
+    ints=[int.from_bytes(m,'big') for m in records]
+    if any(m>=n for m in ints):
+        raise ValueError("hay mensajes que no caben en el módulo RSA")
+    return _map_batches(_pow_many,ints,(e,n),workers,chunksize)
+
+@instrumentation.instrumentado
+def decrypt_many(cyphers,key,encoding="utf8",size=None,workers=None,chunksize=256):
+    """
+    decrypt_many(cyphers,key,encoding="utf8",size=None,workers=None,chunksize=256): Decriptación RSA por lotes
+    ---
+    Entrada: cyphers es un iterable de textos cifrados en decimal
+             key es un PrivateKey, cuyos parámetros del TCR se reutilizan en todo el lote
+             encoding es la codificiación de las cadenas (default: UTF-8; None regresa bytes)
+             size es el tamaño fijo en bytes de cada registro (default: None, i.e. el
+             mínimo, que pierde los bytes cero iniciales); para recuperar un buffer
+             de encrypt_many hay que pasar el mismo tamaño de registro, por omisión
+             (n.bit_length()-1)//8
+             workers es la cantidad de procesos (default: None, i.e. en serie)
+             chunksize es la cantidad de mensajes por lote enviado a cada proceso
+
+    Salida:  una lista con los mensajes decriptados.
+    """
+    ints=_map_batches(_crt_many,list(cyphers),(key,),workers,chunksize)
+    if size is None:
+        records=[w.to_bytes((w.bit_length()+7)//8,'big') for w in ints]
+    else:
+        records=[w.to_bytes(size,'big') for w in ints]
+    return records if encoding is None else [r.decode(encoding) for r in records]
+
+def _chunks(source,chunksize=1<<16):
+    # Itera sobre los fragmentos de un archivo, mmap, buffer o generador de bytes
+    if isinstance(source,(bytes,bytearray,memoryview)):
+        # Rebanadas de la vista, para no copiar el buffer completo
+        view=memoryview(source).cast('B')
+        for i in range(0,len(view),chunksize):
+            yield view[i:i+chunksize]
+    elif hasattr(source,"read"):
+        yield from iter(lambda: source.read(chunksize),b"")
+    else:
+        yield from source
+
+def _blocks(source,size):
+    # Reagrupa los fragmentos en bloques de exactamente size bytes (salvo el último)
+    buffer=bytearray()
+    for chunk in _chunks(source):
+        buffer+=chunk
+        pos=0
+        while len(buffer)-pos>=size:
+            yield bytes(buffer[pos:pos+size])
+            pos+=size
+        del buffer[:pos]
+    if buffer:
+        yield bytes(buffer)
+
+def block_sizes(n):
+    """
+    block_sizes(n): Tamaños de bloque para la encriptación por flujo
+    ---
+    Entrada: n es el módulo RSA
+
+    Salida:  k es la cantidad de bytes de texto plano por bloque (k<n en bytes)
+             w es la cantidad de bytes de cada bloque cifrado
+    """
+    k=(n.bit_length()-1)//8
+    if k<1:
+        raise ValueError("el módulo RSA es demasiado pequeño para encriptar bytes")
+    return k,(n.bit_length()+7)//8
+
+def encrypt_stream(source,e,n):
+    """
+    encrypt_stream(source,e,n): Encriptación RSA por flujo de datos de tamaño arbitrario
+    ---
+    Entrada: source es un archivo binario, mmap, buffer o generador de bytes
+             e es el exponente de encriptación
+             n es el módulo RSA
+
+    Salida:  un generador de tramas, cada una con 2 bytes para la longitud del
+             bloque de texto plano y w bytes con el bloque cifrado
+    """
+    k,w=block_sizes(n)
+    for block in _blocks(source,k):
+        c=pow(int.from_bytes(block,'big'),e,n)
+        yield len(block).to_bytes(2,'big')+c.to_bytes(w,'big')
+
+def decrypt_stream(source,key):
+    """
+    decrypt_stream(source,key): Decriptación RSA por flujo de tramas de encrypt_stream
+    ---
+    Entrada: source es un archivo binario, mmap, buffer o generador con las tramas cifradas
+             key es un PrivateKey
+
+    Salida:  un generador con los bloques de texto plano
+    """
+    _,w=block_sizes(key.n)
+    for frame in _blocks(source,2+w):
+        if len(frame)!=2+w:
+            raise ValueError("trama cifrada truncada")
+        size=int.from_bytes(frame[:2],'big')
+        yield key.decrypt_int(int.from_bytes(frame[2:],'big')).to_bytes(size,'big')
+
+@instrumentation.instrumentado
 def try_decrypt(cypher,e,n,encoding="utf-8"):
     """
     try_decrypt(cypher,e,n,encoding="utf-8"): Intentar romper un módulo RSA
@@ -132,7 +599,11 @@ def try_decrypt(cypher,e,n,encoding="utf-8"):
 
     Salida:  una cadena con el mensaje decriptado.
     """
-    p,q=factoring.division_tentativa_sp(n)
-    phi=(p-1)*(q-1)
-    d=extended_euclidean_algorithm(e,phi)
+    factores,_=factoring.factorizar(n)
+    # phi(n)=prod p^{k-1}(p-1) sobre los factores p^k de n
+    phi=1
+    for p in set(factores):
+        k=factores.count(p)
+        phi*=p**(k-1)*(p-1)
+    d=modular_inverse(e,phi)
     return raw_decrypt(cypher,d,n,encoding=encoding)
@@ -0,0 +1,528 @@
+"""
+service.py - Servicio asíncrono de encriptación, decriptación y generación de claves
+---
+Autor: Erik Alberto Ríos Mena
+
+Envuelve las operaciones de rsa.py en una API de asyncio. Las peticiones
+concurrentes con la misma clave se juntan en lotes que se exponencian en un
+pool de procesos, de modo que el ciclo de eventos nunca se bloquea. La
+cantidad de peticiones en curso está acotada (contrapresión) y cada
+operación lleva un histograma de latencias.
+
+El servidor habla JSON por líneas sobre un socket local:
+    {"id": 1, "op": "encrypt", "plaintext": "hola", "e": 65537, "n": ...}
+    {"id": 2, "op": "decrypt", "cypher": ..., "key": [p, q, e, d, r_3, ...]}
+    {"id": 3, "op": "decrypt", "cypher": ..., "d": ..., "n": ...}
+    {"id": 4, "op": "keygen", "bits": 512}
+y responde {"id": ..., "result": ...} o {"id": ..., "error": "..."}.
+
+Uso:
+    python service.py [-w procesos] [--max-pending 1024] serve [--socket ruta | --port puerto]
+    python service.py [-w procesos] load [-n peticiones] [-c concurrencia] [--bits 512] [--server]
+"""
+
+import sys
+import json
+import math
+import time
+import asyncio
+import argparse
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import rsa
+
+class LatencyHistogram:
+    """
+    LatencyHistogram(): Histograma de latencias con cubetas logarítmicas
+    ---
+    La cubeta k cuenta las latencias entre 2^(k-1) y 2^k microsegundos, así
+    que los percentiles tienen un error relativo de a lo más un factor de 2.
+    """
+
+    __slots__=("counts","total","seconds","max")
+
+    def __init__(self):
+        self.counts=[]
+        self.total=0
+        self.seconds=0.0
+        self.max=0.0
+
+    def record(self,seconds):
+        """
+        record(seconds): Registra una latencia
+        ---
+        Entrada: seconds es la duración en segundos
+        """
+        k=max(0,math.ceil(seconds*1e6)).bit_length()
+        if k>=len(self.counts):
+            self.counts.extend([0]*(k+1-len(self.counts)))
+        self.counts[k]+=1
+        self.total+=1
+        self.seconds+=seconds
+        self.max=max(self.max,seconds)
+
+    def percentile(self,q):
+        """
+        percentile(q): Cota superior del percentil q
+        ---
+        Entrada: q es un número entre 0 y 100
+        Salida:  el límite superior, en segundos, de la cubeta del percentil (None si está vacío)
+        """
+        if self.total==0:
+            return None
+        objetivo=q/100*self.total
+        acumulado=0
+        for k,c in enumerate(self.counts):
+            acumulado+=c
+            if acumulado>=objetivo and c:
+                return min((1<<k)*1e-6,self.max)
+        return self.max
+
+    def summary(self):
+        """
+        summary(): Resumen del histograma
+        ---
+        Salida:  un diccionario con la cantidad, media, p50, p90, p99 y máximo en segundos
+        """
+        return {"count":self.total,
+                "mean":self.seconds/self.total if self.total else None,
+                "p50":self.percentile(50),
+                "p90":self.percentile(90),
+                "p99":self.percentile(99),
+                "max":self.max if self.total else None}
+
+class _Batch:
+    # Peticiones pendientes con la misma clave: enteros de entrada y sus futuros
+    __slots__=("func","arg","ints","futures","timer")
+
+    def __init__(self,func,arg):
+        self.func,self.arg=func,arg
+        self.ints=[]
+        self.futures=[]
+        self.timer=None
+
+class RSAService:
+    """
+    RSAService(workers=None,max_pending=1024,batch_size=64,batch_delay=0.002): Servicio RSA asíncrono
+    ---
+    Entrada: workers es la cantidad de procesos que exponencian (default: os.cpu_count())
+             max_pending es la cantidad máxima de peticiones en curso; las demás esperan turno
+             batch_size es la cantidad de peticiones con la misma clave que llenan un lote
+             batch_delay es cuántos segundos espera un lote incompleto antes de enviarse
+
+    Debe crearse y usarse dentro de un ciclo de eventos; close() libera los procesos.
+    """
+
+    def __init__(self,workers=None,max_pending=1024,batch_size=64,batch_delay=0.002):
+        self.batch_size=batch_size
+        self.batch_delay=batch_delay
+        self.latency={op:LatencyHistogram() for op in ("encrypt","decrypt","keygen")}
+        self.batches_sent=0
+        self._slots=asyncio.Semaphore(max_pending)
+        self._batches={}
+        # Claves privadas de las peticiones del servidor, por (n,d), en orden de uso
+        self._keys=OrderedDict()
+        self._pool=ProcessPoolExecutor(max_workers=workers)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self,*exc):
+        self.close()
+
+    def close(self):
+        """
+        close(): Envía los lotes pendientes y libera los procesos
+        """
+        for batch_key in list(self._batches):
+            self._flush(batch_key)
+        self._pool.shutdown(wait=True)
+
+    def _private_key(self,values,maxsize=1024):
+        # PrivateKey de los parámetros [p,q,e,d,r_3,...] de una petición; se construye una
+        # sola vez por clave para no recalcular qInv y los t_i en cada decriptación
+        p,q,e,d,*others=values
+        clave=(math.prod(others,start=p*q),d)
+        key=self._keys.get(clave)
+        if key is None:
+            key=self._keys[clave]=rsa.PrivateKey(p,q,e,d,others)
+            if len(self._keys)>maxsize:
+                self._keys.popitem(last=False)
+        else:
+            self._keys.move_to_end(clave)
+        return key
+
+    def _submit(self,batch_key,func,arg,value):
+        # Agrega un entero al lote de su clave y regresa el futuro de su resultado
+        batch=self._batches.get(batch_key)
+        if batch is None:
+            batch=self._batches[batch_key]=_Batch(func,arg)
+            batch.timer=asyncio.get_running_loop().call_later(self.batch_delay,self._flush,batch_key)
+        future=asyncio.get_running_loop().create_future()
+        batch.ints.append(value)
+        batch.futures.append(future)
+        if len(batch.ints)>=self.batch_size:
+            self._flush(batch_key)
+        return future
+
+    def _flush(self,batch_key):
+        # Manda el lote de una clave al pool y reparte los resultados al terminar
+        batch=self._batches.pop(batch_key,None)
+        if batch is None:
+            return
+        batch.timer.cancel()
+        self.batches_sent+=1
+        done=asyncio.wrap_future(self._pool.submit(batch.func,batch.ints,*batch.arg))
+        done.add_done_callback(lambda done: self._deliver(batch,done))
+
+    @staticmethod
+    def _deliver(batch,done):
+        # Resuelve los futuros de un lote con sus resultados o con la excepción
+        if done.cancelled() or done.exception() is not None:
+            error=done.exception() if not done.cancelled() else asyncio.CancelledError()
+            for f in batch.futures:
+                if not f.done():
+                    f.set_exception(error)
+            return
+        for f,x in zip(batch.futures,done.result()):
+            if not f.done():
+                f.set_result(x)
+
+    async def _timed(self,op,start,*args):
+        # Espera turno (contrapresión) antes de encolar la operación y registra su
+        # latencia, incluida esa espera
+        ini=time.perf_counter()
+        async with self._slots:
+            try:
+                return await start(*args)
+            finally:
+                self.latency[op].record(time.perf_counter()-ini)
+
+    async def encrypt_int(self,message,e,n):
+        """
+        encrypt_int(message,e,n): Calcula c=w^e mod n en un lote con la clave (e,n)
+        ---
+        Entrada: message es el mensaje como entero, menor que n
+                 e es el exponente de encriptación
+                 n es el módulo RSA
+
+        Salida:  el texto cifrado como entero
+        """
+        if not 0<=message<n:
+            raise ValueError("el mensaje no cabe en el módulo RSA")
+        return await self._timed("encrypt",self._submit,("pow",e,n),rsa._pow_many,(e,n),message)
+
+    async def decrypt_int(self,cypher,key,n=None):
+        """
+        decrypt_int(cypher,key,n=None): Calcula w=c^d mod n en un lote con la misma clave
+        ---
+        Entrada: cypher es el texto cifrado como entero
+                 key es un rsa.PrivateKey (se decripta con el TCR) o el exponente d
+                 n es el módulo RSA cuando key es el exponente d
+
+        Salida:  el mensaje como entero
+        """
+        if isinstance(key,rsa.PrivateKey):
+            return await self._timed("decrypt",self._submit,("crt",key.n,key.d),rsa._crt_many,(key,),cypher)
+        return await self._timed("decrypt",self._submit,("pow",key,n),rsa._pow_many,(key,n),cypher)
+
+    async def encrypt(self,plaintext,e,n,encoding="utf8"):
+        """
+        encrypt(plaintext,e,n,encoding="utf8"): Versión asíncrona de rsa.raw_encrypt
+        ---
+        Entrada: plaintext es una cadena de caracteres (o bytes)
+                 e es el exponente de encriptación
+                 n es el módulo RSA
+                 encoding es la codificiación de la cadena (default: UTF-8)
+
+        Salida:  la representación decimal del mensaje encriptado.
+        """
+        if isinstance(plaintext,str):
+            plaintext=plaintext.encode(encoding)
+        return await self.encrypt_int(int.from_bytes(plaintext,'big'),e,n)
+
+    async def decrypt(self,cypher,key,n=None,encoding="utf8"):
+        """
+        decrypt(cypher,key,n=None,encoding="utf8"): Versión asíncrona de rsa.raw_decrypt y rsa.crt_decrypt
+        ---
+        Entrada: cypher es el texto cifrado en decimal
+                 key es un rsa.PrivateKey o el exponente d
+                 n es el módulo RSA cuando key es el exponente d
+                 encoding es la codificiación de la cadena (default: UTF-8; None regresa bytes)
+
+        Salida:  una cadena con el mensaje decriptado.
+        """
+        w=await self.decrypt_int(cypher,key,n)
+        data=w.to_bytes((w.bit_length()+7)//8,'big')
+        return data if encoding is None else data.decode(encoding)
+
+    async def generate_keys(self,bits=512,**kwargs):
+        """
+        generate_keys(bits=512,**kwargs): Versión asíncrona de rsa.generate_private_key
+        ---
+        Entrada: bits es la cantidad de bits de cada primo
+                 kwargs son los demás argumentos de rsa.generate_private_key
+
+        Salida:  un rsa.PrivateKey generado en el pool de procesos
+        """
+        loop=asyncio.get_running_loop()
+        return await self._timed("keygen",loop.run_in_executor,self._pool,_generate,bits,kwargs)
+
+    def stats(self):
+        """
+        stats(): Contadores del servicio
+        ---
+        Salida:  un diccionario con los lotes enviados, los lotes abiertos y el
+                 resumen de latencias de cada operación
+        """
+        return {"batches":self.batches_sent,
+                "open_batches":len(self._batches),
+                "latency":{op:h.summary() for op,h in self.latency.items()}}
+
+def _generate(bits,kwargs):
+    # Generación de clave en un proceso hijo
+    return rsa.generate_private_key(bits=bits,**kwargs)
+
+#==================
+# Servidor local
+#==================
+
+async def _handle(service,request):
+    # Atiende una petición ya decodificada y regresa su resultado serializable
+    op=request["op"]
+    if op=="encrypt":
+        return await service.encrypt(request["plaintext"],request["e"],request["n"])
+    if op=="decrypt":
+        key=service._private_key(request["key"]) if "key" in request else request["d"]
+        return await service.decrypt(request["cypher"],key,request.get("n"))
+    if op=="keygen":
+        key=await service.generate_keys(request.get("bits",512))
+        return [key.p,key.q,key.n,key.e,key.d]
+    if op=="stats":
+        return service.stats()
+    raise ValueError(f"operación desconocida: {op}")
+
+async def _connection(service,reader,writer,limit):
+    # Lee peticiones de una conexión y responde cada una en cuanto termina
+    lock=asyncio.Lock()
+    # Cada conexión tiene a lo más limit peticiones sin responder; al llenarse deja de
+    # leer el socket y la contrapresión llega al cliente por TCP
+    inflight=asyncio.Semaphore(limit)
+    tasks=set()
+
+    async def answer(line):
+        try:
+            request=json.loads(line)
+        except ValueError as error:
+            request,response={},{"error":f"JSON inválido: {error}"}
+        else:
+            try:
+                response={"result":await _handle(service,request)}
+            except Exception as error:
+                response={"error":f"{type(error).__name__}: {error}"}
+        response["id"]=request.get("id") if isinstance(request,dict) else None
+        try:
+            async with lock:
+                writer.write(json.dumps(response).encode()+b"\n")
+                await writer.drain()
+        finally:
+            inflight.release()
+
+    try:
+        while(True):
+            await inflight.acquire()
+            line=await reader.readline()
+            if not line:
+                break
+            task=asyncio.create_task(answer(line))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+        # Los procesos del pool creados con fork heredan el socket, así que cerrarlo
+        # aquí no basta para que el cliente vea el fin de la conexión
+        if writer.can_write_eof():
+            writer.write_eof()
+    finally:
+        writer.close()
+
+async def serve(service,path=None,host="127.0.0.1",port=0,limit=256):
+    """
+    serve(service,path=None,host="127.0.0.1",port=0,limit=256): Servidor local del servicio
+    ---
+    Entrada: service es un RSAService
+             path es la ruta de un socket Unix (default: None, i.e. usar TCP)
+             host y port son la dirección TCP (port=0 elige un puerto libre)
+             limit es la cantidad de peticiones sin responder por conexión
+
+    Salida:  el asyncio.Server ya escuchando
+    """
+    handler=lambda reader,writer: _connection(service,reader,writer,limit)
+    if path is not None:
+        return await asyncio.start_unix_server(handler,path)
+    return await asyncio.start_server(handler,host,port)
+
+class Client:
+    """
+    Client(reader,writer): Cliente del servidor local con peticiones concurrentes
+    ---
+    Se crea con Client.connect; cada método envía una petición y espera su
+    respuesta, así que muchas corrutinas pueden compartir la misma conexión.
+    """
+
+    def __init__(self,reader,writer):
+        self._reader,self._writer=reader,writer
+        self._pending={}
+        self._next=0
+        self._listener=asyncio.create_task(self._listen())
+
+    @classmethod
+    async def connect(cls,path=None,host="127.0.0.1",port=None):
+        """
+        connect(path=None,host="127.0.0.1",port=None): Abre una conexión con el servidor
+        ---
+        Entrada: path es la ruta del socket Unix, o host y port la dirección TCP
+        Salida:  un Client
+        """
+        if path is not None:
+            reader,writer=await asyncio.open_unix_connection(path,limit=1<<20)
+        else:
+            reader,writer=await asyncio.open_connection(host,port,limit=1<<20)
+        return cls(reader,writer)
+
+    async def _listen(self):
+        # Reparte cada respuesta al futuro de su petición
+        try:
+            while(True):
+                line=await self._reader.readline()
+                if not line:
+                    break
+                response=json.loads(line)
+                future=self._pending.pop(response["id"],None)
+                if future is None or future.done():
+                    continue
+                if "error" in response:
+                    future.set_exception(RuntimeError(response["error"]))
+                else:
+                    future.set_result(response["result"])
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("el servidor cerró la conexión"))
+            self._pending.clear()
+
+    async def request(self,op,**fields):
+        """
+        request(op,**fields): Envía una petición y espera su resultado
+        ---
+        Entrada: op es la operación ("encrypt", "decrypt", "keygen" o "stats")
+                 fields son los campos de la petición
+        Salida:  el campo result de la respuesta
+        """
+        self._next+=1
+        future=asyncio.get_running_loop().create_future()
+        self._pending[self._next]=future
+        self._writer.write(json.dumps({"id":self._next,"op":op,**fields}).encode()+b"\n")
+        await self._writer.drain()
+        return await future
+
+    async def encrypt(self,plaintext,e,n):
+        """
+        encrypt(plaintext,e,n): Encripta una cadena en el servidor, como RSAService.encrypt
+        """
+        return await self.request("encrypt",plaintext=plaintext,e=e,n=n)
+
+    async def decrypt(self,cypher,key):
+        """
+        decrypt(cypher,key): Decripta con un rsa.PrivateKey en el servidor, como RSAService.decrypt
+        """
+        return await self.request("decrypt",cypher=cypher,key=[key.p,key.q,key.e,key.d,*key.primes[2:]])
+
+    async def generate_keys(self,bits=512):
+        """
+        generate_keys(bits=512): Genera un rsa.PrivateKey en el servidor, como RSAService.generate_keys
+        """
+        p,q,n,e,d=await self.request("keygen",bits=bits)
+        return rsa.PrivateKey(p,q,e,d)
+
+    async def close(self):
+        """
+        close(): Cierra la conexión después de recibir las respuestas pendientes
+        """
+        # Medio cierre: el servidor ve el fin de las peticiones, responde las que
+        # quedan y cierra su lado, lo que termina a _listen
+        self._writer.write_eof()
+        await self._listener
+        self._writer.close()
+        await self._writer.wait_closed()
+
+async def load_test(service,requests=10000,concurrency=256,bits=512,keys=4):
+    """
+    load_test(service,requests=10000,concurrency=256,bits=512,keys=4): Prueba de carga en el mismo proceso
+    ---
+    Entrada: service es un RSAService, o un Client para pasar por el servidor local
+             requests es la cantidad de pares encriptación/decriptación
+             concurrency es la cantidad de corrutinas cliente
+             bits es la cantidad de bits de cada primo de las claves
+             keys es la cantidad de claves distintas entre las que se reparten las peticiones
+
+    Salida:  un diccionario con el tiempo total y las operaciones por segundo
+    """
+    claves=await asyncio.gather(*(service.generate_keys(bits) for _ in range(keys)))
+    queue=iter(range(requests))
+
+    async def worker():
+        for i in queue:
+            key=claves[i%keys]
+            mensaje=f"mensaje {i}"
+            cypher=await service.encrypt(mensaje,key.e,key.n)
+            if await service.decrypt(cypher,key)!=mensaje:
+                raise AssertionError(f"la petición {i} no regresó su mensaje")
+
+    ini=time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    total=time.perf_counter()-ini
+    return {"seconds":total,"ops_per_second":2*requests/total}
+
+async def _main(args):
+    async with RSAService(args.workers,args.max_pending,args.batch_size,args.batch_delay) as service:
+        if args.orden=="load" and not args.server:
+            resultados=await load_test(service,args.requests,args.concurrency,args.bits,args.keys)
+            print(json.dumps({**resultados,**service.stats()},indent=1))
+            return
+        server=await serve(service,args.socket,args.host,args.port)
+        if args.orden=="load":
+            # El cliente corre en el mismo proceso pero pasa por el socket y el protocolo
+            async with server:
+                client=await Client.connect(args.socket,*server.sockets[0].getsockname()[:2])
+                resultados=await load_test(client,args.requests,args.concurrency,args.bits,args.keys)
+                await client.close()
+            print(json.dumps({**resultados,**service.stats()},indent=1))
+            return
+        direcciones=", ".join(str(s.getsockname()) for s in server.sockets)
+        print(f"Escuchando en {direcciones}",file=sys.stderr)
+        async with server:
+            await server.serve_forever()
+
+if __name__ == '__main__':
+    parser=argparse.ArgumentParser(description="Servicio RSA asíncrono con lotes por clave.")
+    parser.add_argument("-w","--workers",type=int,default=None,help="procesos que exponencian")
+    parser.add_argument("--max-pending",type=int,default=1024,help="peticiones en curso antes de esperar turno")
+    parser.add_argument("--batch-size",type=int,default=64)
+    parser.add_argument("--batch-delay",type=float,default=0.002)
+    sub=parser.add_subparsers(dest="orden",required=True)
+    serve_parser=sub.add_parser("serve",help="atiende peticiones JSON por líneas")
+    serve_parser.add_argument("--socket",default=None,help="ruta de un socket Unix")
+    serve_parser.add_argument("--host",default="127.0.0.1")
+    serve_parser.add_argument("--port",type=int,default=8750)
+    load=sub.add_parser("load",help="prueba de carga dentro del mismo proceso")
+    load.add_argument("--server",action="store_true",help="pasar por el servidor local con un Client")
+    load.add_argument("--socket",default=None,help="ruta de un socket Unix (con --server)")
+    load.add_argument("--host",default="127.0.0.1")
+    load.add_argument("--port",type=int,default=0)
+    load.add_argument("-n","--requests",type=int,default=10000)
+    load.add_argument("-c","--concurrency",type=int,default=256)
+    load.add_argument("--bits",type=int,default=512)
+    load.add_argument("--keys",type=int,default=4)
+    args=parser.parse_args()
+    asyncio.run(_main(args))